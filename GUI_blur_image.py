@@ -1,8 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, colorchooser
 from PIL import Image, ImageTk, ImageDraw
-import cv2
-import numpy as np
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from blur_engine import (apply_operation, blur_tile, load_template, make_template, open_tiled,
+                         operation_boxes, render_file, save_template, template_operations)
+from face_detect import DETECTION_ERROR, cached_detect_zones
+
+DISPLAY_SIZE = (800, 600)
+
+# Compressed pre-change tiles kept for undo; the oldest steps are dropped beyond this
+UNDO_BUDGET_BYTES = 32 * 1024 * 1024
+
+# Control changes are previewed once they have settled for this long
+PREVIEW_DELAY_MS = 40
+
+# Gigapixel scans are the point of the tiled mode
+Image.MAX_IMAGE_PIXELS = None
+
 
 class ImageBlurApp:
     def __init__(self, root):
@@ -10,11 +28,24 @@ class ImageBlurApp:
         self.root.title("Image Blur Application")
         
         # Initialize variables
-        self.original_image = None
+        self.source_path = None
+        self.source_size = None
+        self.source_image = None    # full resolution, only touched when saving
+        self.mapped_source = None   # used instead of source_image in tiled mode
+        self.proxy_image = None     # downscaled copy shown and edited on the canvas
+        self.scale = 1.0            # proxy pixels per source pixel
+        self.operations = []        # applied blurs, in source coordinates
+        self.undo_stack = []        # (operation, compressed proxy tiles it overwrote)
+        self.redo_stack = []        # operations undone, newest last
+        self.undo_bytes = 0
         self.display_image = None
         self.blur_zones = []
         self.current_selection = None
         self.drawing = False
+        self.preview_job = None     # pending after() id of a debounced preview
+        self.preview_generation = 0 # bumped on every change; stale previews are dropped
+        self.preview_boxes = []     # proxy boxes currently showing a preview
+        self.preview_worker = ThreadPoolExecutor(max_workers=1)
         
         self.setup_ui()
         
@@ -28,7 +59,20 @@ class ImageBlurApp:
         button_frame.grid(row=0, column=0, columnspan=2, pady=5)
         
         ttk.Button(button_frame, text="Upload Image", command=self.upload_image).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Save Image", command=self.save_image).pack(side=tk.LEFT, padx=5)
+        self.save_button = ttk.Button(button_frame, text="Save Image", command=self.save_image)
+        self.save_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Undo", command=self.undo).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Redo", command=self.redo).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Save Template", command=self.save_template).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Load Template", command=self.load_template).pack(side=tk.LEFT, padx=5)
+        self.detect_button = ttk.Button(button_frame, text="Auto-Detect", command=self.auto_detect)
+        self.detect_button.pack(side=tk.LEFT, padx=5)
+        self.status_label = ttk.Label(button_frame, text="")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        if DETECTION_ERROR:
+            # This OpenCV has no face detector
+            self.detect_button.config(state=tk.DISABLED)
+            self.status_label.config(text=f"Auto-Detect unavailable: {DETECTION_ERROR}")
         
         # Canvas for image display
         self.canvas = tk.Canvas(main_frame, width=800, height=600, bg='white')
@@ -42,51 +86,83 @@ class ImageBlurApp:
         ttk.Label(controls_frame, text="Blur Type:").grid(row=0, column=0, pady=5)
         self.blur_type = ttk.Combobox(controls_frame, values=["Gaussian", "Motion", "Average"])
         self.blur_type.set("Gaussian")
+        self.blur_type.bind("<<ComboboxSelected>>", lambda event: self.schedule_preview())
         self.blur_type.grid(row=0, column=1, pady=5)
         
         # Blur intensity
         ttk.Label(controls_frame, text="Blur Intensity:").grid(row=1, column=0, pady=5)
-        self.blur_intensity = ttk.Scale(controls_frame, from_=1, to=50, orient=tk.HORIZONTAL)
+        self.blur_intensity = ttk.Scale(controls_frame, from_=1, to=50, orient=tk.HORIZONTAL,
+                                        command=lambda value: self.schedule_preview())
         self.blur_intensity.grid(row=1, column=1, pady=5)
         
+        # Motion blur direction
+        ttk.Label(controls_frame, text="Motion Angle:").grid(row=2, column=0, pady=5)
+        self.motion_angle = ttk.Scale(controls_frame, from_=0, to=180, orient=tk.HORIZONTAL,
+                                      command=lambda value: self.schedule_preview())
+        self.motion_angle.grid(row=2, column=1, pady=5)
+        
         # Color blur option
-        ttk.Label(controls_frame, text="Color Blur:").grid(row=2, column=0, pady=5)
+        ttk.Label(controls_frame, text="Color Blur:").grid(row=3, column=0, pady=5)
         self.color_button = ttk.Button(controls_frame, text="Select Color", command=self.choose_color)
-        self.color_button.grid(row=2, column=1, pady=5)
+        self.color_button.grid(row=3, column=1, pady=5)
         self.blur_color = None
         
         # Apply blur button
-        ttk.Button(controls_frame, text="Apply Blur", command=self.apply_blur).grid(row=3, column=0, columnspan=2, pady=10)
+        ttk.Button(controls_frame, text="Apply Blur", command=self.apply_blur).grid(row=4, column=0, columnspan=2, pady=10)
         
         # Canvas bindings
         self.canvas.bind("<Button-1>", self.start_selection)
         self.canvas.bind("<B1-Motion>", self.update_selection)
         self.canvas.bind("<ButtonRelease-1>", self.end_selection)
+        self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
         
     def upload_image(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff")]
+            filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tif *.tiff *.ppm")]
         )
         if file_path:
-            self.original_image = Image.open(file_path)
-            # Resize image to fit canvas while maintaining aspect ratio
-            display_size = (800, 600)
-            self.original_image.thumbnail(display_size, Image.Resampling.LANCZOS)
-            self.display_image = ImageTk.PhotoImage(self.original_image)
-            self.canvas.config(width=self.original_image.width, height=self.original_image.height)
+            self.clear_preview()
+            self.source_path = file_path
+            self.source_image = None
+            with Image.open(file_path) as image:
+                source_size = image.size
+            # Large uncompressed images are edited out of core
+            self.mapped_source = open_tiled(file_path)
+
+            # Edit on a proxy that fits the canvas; the source keeps full resolution
+            if self.mapped_source:
+                self.proxy_image = self.mapped_source.proxy(DISPLAY_SIZE)
+            else:
+                self.source_image = Image.open(file_path).convert("RGB")
+                self.proxy_image = self.source_image.copy()
+                self.proxy_image.thumbnail(DISPLAY_SIZE, Image.Resampling.LANCZOS)
+            self.source_size = source_size
+            self.scale = self.proxy_image.width / source_size[0]
+            self.operations = []
+            self.undo_stack = []
+            self.redo_stack = []
+            self.undo_bytes = 0
+            self.blur_zones = []
+            self.display_image = ImageTk.PhotoImage(self.proxy_image)
+            self.canvas.config(width=self.proxy_image.width, height=self.proxy_image.height)
+            self.canvas.delete("all")
             self.canvas.create_image(0, 0, anchor="nw", image=self.display_image)
+            mode = " (tiled)" if self.mapped_source else ""
+            self.status_label.config(text=f"{source_size[0]}x{source_size[1]}{mode}")
             
     def choose_color(self):
         color = colorchooser.askcolor(title="Choose blur color")[0]
         if color:
             self.blur_color = color
+            self.schedule_preview()
             
     def start_selection(self, event):
-        if self.original_image:
+        if self.proxy_image:
             self.drawing = True
             self.current_selection = [event.x, event.y, event.x, event.y]
             self.selection_rect = self.canvas.create_rectangle(
-                *self.current_selection, outline="red", width=2
+                *self.current_selection, outline="red", width=2, tags="selection"
             )
             
     def update_selection(self, event):
@@ -99,54 +175,202 @@ class ImageBlurApp:
         if self.drawing:
             self.drawing = False
             self.blur_zones.append(self.current_selection)
+            self.schedule_preview()
             
+    def to_source_zone(self, zone):
+        # Canvas selection -> ordered, clamped box in source pixels
+        x1, y1, x2, y2 = zone
+        left, right = sorted((x1, x2))
+        top, bottom = sorted((y1, y2))
+        left, right = (min(max(x, 0), self.proxy_image.width) / self.scale for x in (left, right))
+        top, bottom = (min(max(y, 0), self.proxy_image.height) / self.scale for y in (top, bottom))
+        return (left, top, right, bottom)
+
+    def current_operation(self):
+        # Pending selections with the current controls, in source coordinates
+        return {
+            "zones": [self.to_source_zone(zone) for zone in self.blur_zones],
+            "type": self.blur_type.get(),
+            "intensity": self.blur_intensity.get() / self.scale,
+            "color": self.blur_color,
+            "angle": round(self.motion_angle.get()),
+        }
+
+    def schedule_preview(self):
+        # Restart the countdown on every change, so dragging a slider only
+        # previews the value it rests on
+        if self.preview_job:
+            self.root.after_cancel(self.preview_job)
+        self.preview_generation += 1
+        self.preview_job = self.root.after(PREVIEW_DELAY_MS, self.start_preview)
+
+    def start_preview(self):
+        self.preview_job = None
+        if not self.proxy_image or not self.blur_zones:
+            return
+        # Tiles are cut here, blurred on the worker and shown back on the Tk thread
+        operation = self.current_operation()
+        tiles = [(box, self.proxy_image.crop(box)) for box in operation_boxes(operation, self.scale)]
+        self.preview_worker.submit(self.render_preview, self.preview_generation, tiles, operation, self.scale)
+
+    def render_preview(self, generation, tiles, operation, scale):
+        patches = [(box, blur_tile(tile, operation, scale)) for box, tile in tiles]
+        self.root.after(0, self.show_preview, generation, patches)
+
+    def show_preview(self, generation, patches):
+        if generation != self.preview_generation:
+            return  # the controls or the image changed since
+        self.restore_preview_boxes()
+        for box, patch in patches:
+            photo = ImageTk.PhotoImage(patch)
+            self.root.tk.call(str(self.display_image), "copy", str(photo), "-to", box[0], box[1])
+        self.preview_boxes = [box for box, _ in patches]
+
+    def restore_preview_boxes(self):
+        # The proxy itself is never previewed on, so it still holds the real pixels
+        for box in self.preview_boxes:
+            self.refresh_region(box)
+        self.preview_boxes = []
+
+    def clear_preview(self):
+        if self.preview_job:
+            self.root.after_cancel(self.preview_job)
+            self.preview_job = None
+        self.preview_generation += 1
+        self.restore_preview_boxes()
+
     def apply_blur(self):
-        if not self.original_image or not self.blur_zones:
+        if not self.proxy_image or not self.blur_zones:
             return
-            
-        # Convert PIL image to OpenCV format
-        img = cv2.cvtColor(np.array(self.original_image), cv2.COLOR_RGB2BGR)
-        
-        for zone in self.blur_zones:
-            x1, y1, x2, y2 = map(int, zone)
-            roi = img[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
-            
-            if self.blur_type.get() == "Gaussian":
-                kernel_size = int(self.blur_intensity.get()) * 2 + 1
-                blurred_roi = cv2.GaussianBlur(roi, (kernel_size, kernel_size), 0)
-            elif self.blur_type.get() == "Motion":
-                kernel_size = int(self.blur_intensity.get())
-                kernel = np.zeros((kernel_size, kernel_size))
-                kernel[int((kernel_size-1)/2), :] = np.ones(kernel_size)
-                kernel = kernel / kernel_size
-                blurred_roi = cv2.filter2D(roi, -1, kernel)
-            else:  # Average blur
-                kernel_size = int(self.blur_intensity.get()) * 2 + 1
-                blurred_roi = cv2.blur(roi, (kernel_size, kernel_size))
-                
-            if self.blur_color:
-                color_overlay = np.full_like(blurred_roi, self.blur_color)
-                alpha = 0.5
-                blurred_roi = cv2.addWeighted(blurred_roi, 1-alpha, color_overlay, alpha, 0)
-                
-            img[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)] = blurred_roi
-            
-        # Convert back to PIL format and update display
-        result_image = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        self.display_image = ImageTk.PhotoImage(result_image)
-        self.canvas.create_image(0, 0, anchor="nw", image=self.display_image)
-        self.original_image = result_image
+        self.apply_operations([self.current_operation()])
         self.blur_zones = []
+
+    def apply_operations(self, operations):
+        self.clear_preview()
+        self.redo_stack = []
+        for operation in operations:
+            self.push_operation(operation)
+        self.canvas.delete("selection")
+
+    def push_operation(self, operation):
+        # Record the blur at source resolution and show it on the proxy,
+        # keeping only the proxy tiles it overwrites for undo
+        tiles = []
+        changed = apply_operation(self.proxy_image, operation, self.scale, tiles)
+        tiles = [(box, zlib.compress(tile.tobytes(), 1)) for box, tile in tiles]
+        self.operations.append(operation)
+        self.undo_stack.append((operation, tiles))
+        self.undo_bytes += sum(len(data) for _, data in tiles)
+        while self.undo_bytes > UNDO_BUDGET_BYTES and len(self.undo_stack) > 1:
+            _, dropped = self.undo_stack.pop(0)
+            self.undo_bytes -= sum(len(data) for _, data in dropped)
+        for box in changed:
+            self.refresh_region(box)
+
+    def refresh_region(self, box):
+        # Copy only the changed rectangle into the photo shown on the canvas
+        patch = ImageTk.PhotoImage(self.proxy_image.crop(box))
+        self.root.tk.call(str(self.display_image), "copy", str(patch), "-to", box[0], box[1])
+
+    def undo(self):
+        if not self.undo_stack:
+            return
+        self.clear_preview()
+        operation, tiles = self.undo_stack.pop()
+        self.undo_bytes -= sum(len(data) for _, data in tiles)
+        # Zones may overlap, so restore them in reverse order
+        for box, data in reversed(tiles):
+            size = (box[2] - box[0], box[3] - box[1])
+            self.proxy_image.paste(Image.frombytes("RGB", size, zlib.decompress(data)), box[:2])
+            self.refresh_region(box)
+        self.operations.pop()
+        self.redo_stack.append(operation)
+        self.schedule_preview()
+
+    def redo(self):
+        if self.redo_stack:
+            self.clear_preview()
+            self.push_operation(self.redo_stack.pop())
+            self.schedule_preview()
+
+    def save_template(self):
+        operations = list(self.operations)
+        if self.blur_zones:
+            operations.append(self.current_operation())
+        if not operations:
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("Blur templates", "*.json")]
+        )
+        if file_path:
+            save_template(file_path, make_template(operations, self.source_size))
+            self.status_label.config(text=f"Template saved to {file_path}")
+
+    def load_template(self):
+        if not self.proxy_image:
+            return
+        file_path = filedialog.askopenfilename(filetypes=[("Blur templates", "*.json")])
+        if file_path:
+            self.apply_operations(template_operations(load_template(file_path), self.source_size))
+            self.blur_zones = []
         
+    def auto_detect(self):
+        if not self.proxy_image:
+            return
+        # Detection runs off the Tk thread; results are cached per image content
+        self.detect_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Detecting faces...")
+        thread = threading.Thread(target=self.detect_in_background, args=(self.source_path,), daemon=True)
+        thread.start()
+
+    def detect_in_background(self, source_path):
+        try:
+            zones, message = cached_detect_zones(source_path), None
+        except Exception as e:
+            zones, message = [], f"Error: {e}"
+        self.root.after(0, self.detect_finished, source_path, zones, message)
+
+    def detect_finished(self, source_path, zones, message):
+        self.detect_button.config(state=tk.NORMAL)
+        if source_path != self.source_path:
+            return  # another image was opened meanwhile
+        # Proposed zones become pending selections, blurred by Apply Blur
+        for zone in zones:
+            selection = [value * self.scale for value in zone]
+            self.canvas.create_rectangle(*selection, outline="red", width=2, tags="selection")
+            self.blur_zones.append(selection)
+        self.status_label.config(text=message or f"Detected {len(zones)} zone(s)")
+        self.schedule_preview()
+
     def save_image(self):
-        if self.original_image:
+        if self.proxy_image:
+            extension = os.path.splitext(self.source_path)[1] if self.mapped_source else ".png"
             file_path = filedialog.asksaveasfilename(
-                defaultextension=".png",
+                defaultextension=extension,
                 filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), 
                           ("All files", "*.*")]
             )
             if file_path:
-                self.original_image.save(file_path)
+                # Full-resolution blurs run off the Tk thread
+                self.save_button.config(state=tk.DISABLED)
+                self.status_label.config(text="Saving at full resolution...")
+                thread = threading.Thread(target=self.render_and_save,
+                                          args=(file_path, self.source_path, self.source_image,
+                                                list(self.operations)),
+                                          daemon=True)
+                thread.start()
+
+    def render_and_save(self, file_path, source_path, source_image, operations):
+        try:
+            render_file(source_path, file_path, operations, source_image)
+            message = f"Saved {file_path}"
+        except Exception as e:
+            message = f"Error: {e}"
+        self.root.after(0, self.save_finished, message)
+
+    def save_finished(self, message):
+        self.save_button.config(state=tk.NORMAL)
+        self.status_label.config(text=message)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -2,43 +2,56 @@
 
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image
+
+import img2pdf
+
 
 def convert_to_pdf():
-    # Open a file dialog to select the image
-    file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png *.jpg *.jpeg")])
-    if not file_path:
+    # Open a file dialog to select the images, in page order
+    file_paths = filedialog.askopenfilenames(
+        filetypes=[("Image Files", "*.png *.jpg *.jpeg *.bmp *.gif *.tif *.tiff *.webp")])
+    if not file_paths:
         return
 
     try:
-        # Open the image
-        image = Image.open(file_path)
-
-        # Convert to RGB if the image has transparency
-        if image.mode == 'RGBA':
-            image = image.convert('RGB')
-
-        # Save the image as a PDF
+        # Save the images as a PDF, one page per image
         output_path = filedialog.asksaveasfilename(defaultextension=".pdf", 
                                                      filetypes=[("PDF Files", "*.pdf")])
         if not output_path:
             return
 
-        image.save(output_path)
-        messagebox.showinfo("Success", f"Image converted to PDF and saved as {output_path}")
+        # Optional page size and resolution cap; large photos are then decoded at reduced scale
+        page_size = page_size_var.get()
+        target_dpi = float(dpi_entry.get()) if dpi_entry.get().strip() else None
+        stats = img2pdf.convert(sorted(file_paths, key=img2pdf.natural_key), output_path, workers=0,
+                                page_size=None if page_size == "Original" else page_size,
+                                target_dpi=target_dpi)
+        messagebox.showinfo("Success", f"{stats['pages']} image(s) converted to PDF and saved as {output_path}\n"
+                                       f"({stats['pages_per_second']:.1f} pages/s)")
     except Exception as e:
         messagebox.showerror("Error", f"An error occurred: {e}")
 
-# Set up the main application window
-root = tk.Tk()
-root.title("Image to PDF Converter")
-root.geometry("300x200")
-root.configure(bg="#f0f0f0")
-
-# Create a button to trigger the conversion
-convert_button = tk.Button(root, text="Convert Image to PDF", command=convert_to_pdf, 
-                            bg="#ffffff", fg="#000000", font=("Arial", 12))
-convert_button.pack(pady=50)
-
-# Start the GUI event loop
-root.mainloop()
+if __name__ == "__main__":
+    # Set up the main application window
+    root = tk.Tk()
+    root.title("Image to PDF Converter")
+    root.geometry("300x250")
+    root.configure(bg="#f0f0f0")
+
+    # Page size and target resolution options
+    options_frame = tk.Frame(root, bg="#f0f0f0")
+    options_frame.pack(pady=(20, 0))
+    tk.Label(options_frame, text="Page size:", bg="#f0f0f0").grid(row=0, column=0, sticky="w", pady=2)
+    page_size_var = tk.StringVar(value="Original")
+    tk.OptionMenu(options_frame, page_size_var, "Original", *img2pdf.PAGE_SIZES).grid(row=0, column=1, sticky="w", pady=2)
+    tk.Label(options_frame, text="Target DPI:", bg="#f0f0f0").grid(row=1, column=0, sticky="w", pady=2)
+    dpi_entry = tk.Entry(options_frame, width=8)
+    dpi_entry.grid(row=1, column=1, sticky="w", pady=2)
+
+    # Create a button to trigger the conversion
+    convert_button = tk.Button(root, text="Convert Images to PDF", command=convert_to_pdf, 
+                                bg="#ffffff", fg="#000000", font=("Arial", 12))
+    convert_button.pack(pady=30)
+
+    # Start the GUI event loop
+    root.mainloop()
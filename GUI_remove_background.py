@@ -1,175 +1,369 @@
-import customtkinter as ctk
-from rembg import remove
-from PIL import Image, ImageTk
-import os
-from pathlib import Path
-import threading
-import time
-from tkinter import filedialog
-import io
-
-class BackgroundRemoverGUI:
-    def __init__(self):
-        # Setup main window
-        self.window = ctk.CTk()
-        self.window.title("Background Remover Pro")
-        self.window.geometry("1000x600")
-        
-        # Set theme
-        ctk.set_appearance_mode("dark")
-        ctk.set_default_color_theme("blue")
-        
-        # Initialize variables
-        self.current_image = None
-        self.processed_image = None
-        self.image_path = None
-        
-        self.setup_ui()
-        
-    def setup_ui(self):
-        # Create main containers
-        self.left_frame = ctk.CTkFrame(self.window, width=480)
-        self.left_frame.pack(side="left", fill="both", padx=10, pady=10)
-        
-        self.right_frame = ctk.CTkFrame(self.window, width=480)
-        self.right_frame.pack(side="right", fill="both", padx=10, pady=10)
-        
-        # Left frame components (Original Image)
-        self.original_label = ctk.CTkLabel(self.left_frame, text="Original Image")
-        self.original_label.pack(pady=5)
-        
-        self.original_image_label = ctk.CTkLabel(self.left_frame, text="No image selected")
-        self.original_image_label.pack(pady=10)
-        
-        # Right frame components (Processed Image)
-        self.processed_label = ctk.CTkLabel(self.right_frame, text="Processed Image")
-        self.processed_label.pack(pady=5)
-        
-        self.processed_image_label = ctk.CTkLabel(self.right_frame, text="No image processed")
-        self.processed_image_label.pack(pady=10)
-        
-        # Control panel
-        self.control_frame = ctk.CTkFrame(self.window)
-        self.control_frame.pack(side="bottom", fill="x", padx=10, pady=10)
-        
-        # Buttons
-        self.select_btn = ctk.CTkButton(
-            self.control_frame, 
-            text="Select Image", 
-            command=self.select_image
-        )
-        self.select_btn.pack(side="left", padx=5)
-        
-        self.process_btn = ctk.CTkButton(
-            self.control_frame, 
-            text="Remove Background", 
-            command=self.process_image,
-            state="disabled"
-        )
-        self.process_btn.pack(side="left", padx=5)
-        
-        self.save_btn = ctk.CTkButton(
-            self.control_frame, 
-            text="Save Image", 
-            command=self.save_image,
-            state="disabled"
-        )
-        self.save_btn.pack(side="left", padx=5)
-        
-        # Progress bar
-        self.progress_bar = ctk.CTkProgressBar(self.control_frame)
-        self.progress_bar.pack(side="left", padx=10, fill="x", expand=True)
-        self.progress_bar.set(0)
-        
-        # Status label
-        self.status_label = ctk.CTkLabel(self.control_frame, text="Ready")
-        self.status_label.pack(side="right", padx=5)
-        
-    def select_image(self):
-        self.image_path = filedialog.askopenfilename(
-            filetypes=[
-                ("Image files", "*.png *.jpg *.jpeg *.webp"),
-                ("All files", "*.*")
-            ]
-        )
-        
-        if self.image_path:
-            self.current_image = Image.open(self.image_path)
-            # Resize image to fit display
-            display_image = self.resize_image_for_display(self.current_image)
-            photo = ImageTk.PhotoImage(display_image)
-            
-            self.original_image_label.configure(image=photo, text="")
-            self.original_image_label.image = photo
-            
-            self.process_btn.configure(state="normal")
-            self.status_label.configure(text="Image loaded")
-            
-    def process_image(self):
-        self.process_btn.configure(state="disabled")
-        self.select_btn.configure(state="disabled")
-        self.status_label.configure(text="Processing...")
-        self.progress_bar.start()
-        
-        # Process image in separate thread
-        thread = threading.Thread(target=self.remove_background)
-        thread.start()
-        
-    def remove_background(self):
-        try:
-            # Remove background
-            self.processed_image = remove(self.current_image)
-            
-            # Display processed image
-            display_image = self.resize_image_for_display(self.processed_image)
-            photo = ImageTk.PhotoImage(display_image)
-            
-            self.processed_image_label.configure(image=photo, text="")
-            self.processed_image_label.image = photo
-            
-            self.window.after(0, self.processing_complete)
-            
-        except Exception as e:
-            self.window.after(0, lambda: self.status_label.configure(
-                text=f"Error: {str(e)}")
-            )
-            
-    def processing_complete(self):
-        self.progress_bar.stop()
-        self.progress_bar.set(1)
-        self.status_label.configure(text="Processing complete")
-        self.process_btn.configure(state="normal")
-        self.select_btn.configure(state="normal")
-        self.save_btn.configure(state="normal")
-        
-    def save_image(self):
-        if self.processed_image:
-            save_path = filedialog.asksaveasfilename(
-                defaultextension=".png",
-                filetypes=[
-                    ("PNG files", "*.png"),
-                    ("All files", "*.*")
-                ]
-            )
-            
-            if save_path:
-                self.processed_image.save(save_path)
-                self.status_label.configure(text="Image saved successfully")
-                
-    def resize_image_for_display(self, image, max_size=(400, 400)):
-        # Calculate aspect ratio
-        aspect_ratio = image.width / image.height
-        
-        if image.width > max_size[0] or image.height > max_size[1]:
-            if aspect_ratio > 1:
-                return image.resize((max_size[0], int(max_size[0] / aspect_ratio)))
-            else:
-                return image.resize((int(max_size[1] * aspect_ratio), max_size[1]))
-        return image
-    
-    def run(self):
-        self.window.mainloop()
-
-if __name__ == "__main__":
-    app = BackgroundRemoverGUI()
+import customtkinter as ctk
+from background_remover import (DEFAULT_MODEL, MODELS, MaskCache, ModelSessions, format_eta,
+                                remove_cached, remove_directory)
+from background_service import DEFAULT_URL, remove_remote, service_available
+from video_background import VIDEO_EXTENSIONS, first_frame, remove_video_background
+from PIL import Image, ImageTk
+import os
+from pathlib import Path
+import threading
+import time
+from tkinter import filedialog
+import io
+
+class BackgroundRemoverGUI:
+    def __init__(self):
+        # Setup main window
+        self.window = ctk.CTk()
+        self.window.title("Background Remover Pro")
+        self.window.geometry("1000x600")
+        
+        # Set theme
+        ctk.set_appearance_mode("dark")
+        ctk.set_default_color_theme("blue")
+        
+        # Initialize variables
+        self.current_image = None
+        self.processed_image = None
+        self.image_path = None
+        self.video_path = None
+        # One warm session per model, loaded in the background from startup
+        self.sessions = ModelSessions()
+        # Masks of images processed before, keyed by content, model and options
+        self.cache = MaskCache()
+        
+        self.setup_ui()
+        # With a background_service.py running, the GUI is only a client and loads no model itself
+        if service_available():
+            self.service_check.select()
+            self.status_label.configure(text=f"Using service at {DEFAULT_URL}")
+        else:
+            self.load_model(DEFAULT_MODEL)
+        
+    def setup_ui(self):
+        # Create main containers
+        self.left_frame = ctk.CTkFrame(self.window, width=480)
+        self.left_frame.pack(side="left", fill="both", padx=10, pady=10)
+        
+        self.right_frame = ctk.CTkFrame(self.window, width=480)
+        self.right_frame.pack(side="right", fill="both", padx=10, pady=10)
+        
+        # Left frame components (Original Image)
+        self.original_label = ctk.CTkLabel(self.left_frame, text="Original Image")
+        self.original_label.pack(pady=5)
+        
+        self.original_image_label = ctk.CTkLabel(self.left_frame, text="No image selected")
+        self.original_image_label.pack(pady=10)
+        
+        # Right frame components (Processed Image)
+        self.processed_label = ctk.CTkLabel(self.right_frame, text="Processed Image")
+        self.processed_label.pack(pady=5)
+        
+        self.processed_image_label = ctk.CTkLabel(self.right_frame, text="No image processed")
+        self.processed_image_label.pack(pady=10)
+        
+        # Control panel
+        self.control_frame = ctk.CTkFrame(self.window)
+        self.control_frame.pack(side="bottom", fill="x", padx=10, pady=10)
+        
+        # Buttons
+        self.select_btn = ctk.CTkButton(
+            self.control_frame, 
+            text="Select Image", 
+            command=self.select_image
+        )
+        self.select_btn.pack(side="left", padx=5)
+        
+        self.process_btn = ctk.CTkButton(
+            self.control_frame, 
+            text="Remove Background", 
+            command=self.process_image,
+            state="disabled"
+        )
+        self.process_btn.pack(side="left", padx=5)
+        
+        self.save_btn = ctk.CTkButton(
+            self.control_frame, 
+            text="Save Image", 
+            command=self.save_image,
+            state="disabled"
+        )
+        self.save_btn.pack(side="left", padx=5)
+        
+        # Model selection
+        self.model_menu = ctk.CTkOptionMenu(
+            self.control_frame,
+            values=list(MODELS),
+            command=self.load_model
+        )
+        self.model_menu.set(DEFAULT_MODEL)
+        self.model_menu.pack(side="left", padx=5)
+        
+        self.matting_check = ctk.CTkCheckBox(self.control_frame, text="Alpha Matting")
+        self.matting_check.pack(side="left", padx=5)
+        
+        # Infer the mask on a small copy and upsample it; much faster on large photos
+        self.fast_check = ctk.CTkCheckBox(self.control_frame, text="Fast Mode")
+        self.fast_check.pack(side="left", padx=5)
+        
+        # Send single images to a local background_service.py instead of running the model here
+        self.service_check = ctk.CTkCheckBox(self.control_frame, text="Use Service", command=self.toggle_service)
+        self.service_check.pack(side="left", padx=5)
+        
+        # Batch processing of a whole folder
+        self.batch_btn = ctk.CTkButton(
+            self.control_frame,
+            text="Batch Folder",
+            command=self.batch_folder
+        )
+        self.batch_btn.pack(side="left", padx=5)
+        
+        self.workers_menu = ctk.CTkOptionMenu(
+            self.control_frame,
+            values=["1 worker", "2 workers", "4 workers", "8 workers"],
+            width=110
+        )
+        self.workers_menu.set("2 workers")
+        self.workers_menu.pack(side="left", padx=5)
+        
+        # Progress bar
+        self.progress_bar = ctk.CTkProgressBar(self.control_frame)
+        self.progress_bar.pack(side="left", padx=10, fill="x", expand=True)
+        self.progress_bar.set(0)
+        
+        # Status label
+        self.status_label = ctk.CTkLabel(self.control_frame, text="Ready")
+        self.status_label.pack(side="right", padx=5)
+        
+    def toggle_service(self):
+        if self.service_check.get():
+            self.status_label.configure(text=f"Using service at {DEFAULT_URL}")
+        else:
+            self.load_model(self.model_menu.get())
+        
+    def load_model(self, model):
+        if self.service_check.get():
+            return  # the service loads models itself
+        self.status_label.configure(text=f"Loading {model}...")
+        self.load_started = time.perf_counter()
+        self.sessions.load(model, on_ready=lambda *args: self.window.after(0, self.model_ready, *args))
+        
+    def model_ready(self, model, seconds, error):
+        if model != self.model_menu.get():
+            return
+        if error:
+            self.status_label.configure(text=f"Error loading {model}: {error}")
+        else:
+            # Time from choosing the model until it can be used
+            waited = time.perf_counter() - self.load_started
+            self.status_label.configure(text=f"{model} ready in {min(seconds, waited):.1f}s")
+        
+    def select_image(self):
+        self.image_path = filedialog.askopenfilename(
+            filetypes=[
+                ("Image files", "*.png *.jpg *.jpeg *.webp"),
+                ("Video files", " ".join("*" + extension for extension in VIDEO_EXTENSIONS)),
+                ("All files", "*.*")
+            ]
+        )
+        
+        if self.image_path:
+            if self.image_path.lower().endswith(VIDEO_EXTENSIONS):
+                # Videos are processed straight from the file; only the first frame is shown
+                self.video_path = self.image_path
+                self.current_image = None
+                display_image = self.resize_image_for_display(first_frame(self.video_path))
+            else:
+                self.video_path = None
+                self.current_image = Image.open(self.image_path)
+                # Resize image to fit display
+                display_image = self.resize_image_for_display(self.current_image)
+            photo = ImageTk.PhotoImage(display_image)
+            
+            self.original_image_label.configure(image=photo, text="")
+            self.original_image_label.image = photo
+            
+            self.process_btn.configure(state="normal")
+            self.status_label.configure(text="Video loaded" if self.video_path else "Image loaded")
+            
+    def process_image(self):
+        if self.video_path:
+            self.process_video()
+            return
+        self.process_btn.configure(state="disabled")
+        self.select_btn.configure(state="disabled")
+        self.status_label.configure(text="Processing...")
+        self.progress_bar.start()
+        
+        # Process image in separate thread
+        thread = threading.Thread(target=self.remove_background)
+        thread.start()
+        
+    def remove_background(self):
+        try:
+            if self.service_check.get():
+                start_time = time.perf_counter()
+                with open(self.image_path, "rb") as image_file:
+                    self.processed_image = remove_remote(image_file.read(), self.model_menu.get(),
+                                                         bool(self.matting_check.get()),
+                                                         bool(self.fast_check.get()))
+            else:
+                # Waits for the model only if it is still warming up
+                session = self.sessions.get(self.model_menu.get())
+                start_time = time.perf_counter()
+                self.processed_image = remove_cached(self.current_image, session, self.model_menu.get(),
+                                                     self.cache, bool(self.matting_check.get()),
+                                                     bool(self.fast_check.get()))
+            seconds = time.perf_counter() - start_time
+            
+            self.window.after(0, self.processing_complete, seconds)
+            
+        except Exception as e:
+            self.window.after(0, self.processing_failed, f"Error: {str(e)}")
+            
+    def processing_failed(self, message):
+        # Leave the window usable for another try
+        self.progress_bar.stop()
+        self.progress_bar.set(0)
+        self.status_label.configure(text=message)
+        self.process_btn.configure(state="normal")
+        self.select_btn.configure(state="normal")
+        
+    def processing_complete(self, seconds):
+        # Display processed image
+        display_image = self.resize_image_for_display(self.processed_image)
+        photo = ImageTk.PhotoImage(display_image)
+        
+        self.processed_image_label.configure(image=photo, text="")
+        self.processed_image_label.image = photo
+        
+        self.progress_bar.stop()
+        self.progress_bar.set(1)
+        self.status_label.configure(text=f"Processing complete in {seconds:.2f}s")
+        self.process_btn.configure(state="normal")
+        self.select_btn.configure(state="normal")
+        self.save_btn.configure(state="normal")
+        
+    def process_video(self):
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".webm",
+            filetypes=[
+                ("WebM with transparency", "*.webm"),
+                ("QuickTime ProRes 4444 with transparency", "*.mov"),
+                ("MP4 on green screen", "*.mp4")
+            ]
+        )
+        if not output_path:
+            return
+        self.process_btn.configure(state="disabled")
+        self.select_btn.configure(state="disabled")
+        self.batch_btn.configure(state="disabled")
+        self.progress_bar.set(0)
+        self.status_label.configure(text="Processing video...")
+        
+        # Frames stream from the input file to the output file, never all in memory
+        thread = threading.Thread(target=self.remove_video, args=(output_path,), daemon=True)
+        thread.start()
+        
+    def remove_video(self, output_path):
+        try:
+            session = self.sessions.get(self.model_menu.get())
+            stats = remove_video_background(
+                self.video_path, output_path, session,
+                progress=lambda *args: self.window.after(0, self.video_progress, *args)
+            )
+            message = (f"Video done: {stats['frames']} frames, {stats['reused']} reused a mask, "
+                       f"{stats['frames_per_second']:.1f} frames/s")
+        except Exception as e:
+            message = f"Error: {str(e)}"
+        self.window.after(0, self.video_complete, message)
+        
+    def video_progress(self, done, total, inferred):
+        if total > 0:
+            self.progress_bar.set(min(1.0, done / total))
+        self.status_label.configure(text=f"{done}/{total} frames, {inferred} inferred")
+        
+    def video_complete(self, message):
+        self.status_label.configure(text=message)
+        self.process_btn.configure(state="normal")
+        self.select_btn.configure(state="normal")
+        self.batch_btn.configure(state="normal")
+        
+    def batch_folder(self):
+        input_dir = filedialog.askdirectory(title="Folder of images")
+        if not input_dir:
+            return
+        output_dir = filedialog.askdirectory(title="Folder for the results")
+        if not output_dir:
+            return
+        workers = int(self.workers_menu.get().split()[0])
+        self.batch_btn.configure(state="disabled")
+        self.process_btn.configure(state="disabled")
+        self.progress_bar.set(0)
+        self.status_label.configure(text=f"Loading {workers} session(s)...")
+        
+        # Results are written to disk as they finish, never kept in memory
+        thread = threading.Thread(
+            target=self.run_batch,
+            args=(input_dir, output_dir, self.model_menu.get(), workers, bool(self.matting_check.get()),
+                  bool(self.fast_check.get())),
+            daemon=True
+        )
+        thread.start()
+        
+    def run_batch(self, input_dir, output_dir, model, workers, alpha_matting, fast):
+        try:
+            stats = remove_directory(
+                input_dir, output_dir, model, workers,
+                progress=lambda *args: self.window.after(0, self.batch_progress, *args),
+                cache=self.cache, alpha_matting=alpha_matting, fast=fast
+            )
+            message = (f"Batch done: {stats['processed']} images, {stats['skipped']} skipped, "
+                       f"{stats['failed']} failed, {stats['images_per_second']:.1f} images/s")
+        except Exception as e:
+            message = f"Error: {str(e)}"
+        self.window.after(0, self.batch_complete, message)
+        
+    def batch_progress(self, done, total, rate, eta):
+        self.progress_bar.set(done / total)
+        self.status_label.configure(
+            text=f"{done}/{total} images, {rate:.1f} images/s, ETA {format_eta(eta)}"
+        )
+        
+    def batch_complete(self, message):
+        self.status_label.configure(text=message)
+        self.batch_btn.configure(state="normal")
+        if self.current_image or self.video_path:
+            self.process_btn.configure(state="normal")
+        
+    def save_image(self):
+        if self.processed_image:
+            save_path = filedialog.asksaveasfilename(
+                defaultextension=".png",
+                filetypes=[
+                    ("PNG files", "*.png"),
+                    ("All files", "*.*")
+                ]
+            )
+            
+            if save_path:
+                self.processed_image.save(save_path)
+                self.status_label.configure(text="Image saved successfully")
+                
+    def resize_image_for_display(self, image, max_size=(400, 400)):
+        # Calculate aspect ratio
+        aspect_ratio = image.width / image.height
+        
+        if image.width > max_size[0] or image.height > max_size[1]:
+            if aspect_ratio > 1:
+                return image.resize((max_size[0], int(max_size[0] / aspect_ratio)))
+            else:
+                return image.resize((int(max_size[1] * aspect_ratio), max_size[1]))
+        return image
+    
+    def run(self):
+        self.window.mainloop()
+
+if __name__ == "__main__":
+    app = BackgroundRemoverGUI()
     app.run()
\ No newline at end of file
@@ -0,0 +1,428 @@
+# pip install rembg Pillow opencv-python numpy
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+from rembg import new_session, remove
+
+MODELS = ("u2net", "u2netp", "isnet-general-use", "u2net_human_seg", "silueta")
+DEFAULT_MODEL = "u2net"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+
+# rembg's alpha matting options, as passed to rembg.remove
+ALPHA_MATTING = {
+    "alpha_matting": True,
+    "alpha_matting_foreground_threshold": 240,
+    "alpha_matting_background_threshold": 10,
+    "alpha_matting_erode_size": 10,
+}
+
+# Fast mode infers the mask on a copy at most this many pixels on its longer
+# side (the models themselves work at 320 or 1024) and upsamples it with a
+# guided filter, whose radius is in pixels of that copy
+FAST_MAX_SIDE = 1024
+GUIDED_RADIUS = 4
+GUIDED_EPS = 1e-3
+
+# The upsampled mask is produced this many full-resolution rows at a time
+UPSAMPLE_BAND_ROWS = 256
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "background_remover")
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# rembg takes the ONNX Runtime thread count from the environment when a
+# session is built, so sessions with different counts are built one at a time
+_environment_lock = threading.Lock()
+
+
+def create_session(model=DEFAULT_MODEL, intra_op_threads=None):
+    """Load a rembg model into a new inference session.
+
+    ``intra_op_threads`` limits the threads ONNX Runtime uses for one
+    inference (default: all cores), which matters when several sessions run
+    side by side.
+    """
+    with _environment_lock:
+        previous = os.environ.get("OMP_NUM_THREADS")
+        if intra_op_threads:
+            os.environ["OMP_NUM_THREADS"] = str(intra_op_threads)
+        try:
+            return new_session(model)
+        finally:
+            if previous is None:
+                os.environ.pop("OMP_NUM_THREADS", None)
+            else:
+                os.environ["OMP_NUM_THREADS"] = previous
+
+
+def warm_up(session):
+    """Run one dummy inference so the first real one does not pay for allocations."""
+    remove(Image.new("RGB", (64, 64)), session=session)
+
+
+class ModelSessions:
+    """One warm rembg session per model, loaded on background threads.
+
+    ``load()`` returns at once; ``get()`` waits until that model is ready.
+    The seconds each model took from load() to ready are kept in
+    ``ready_seconds``.
+    """
+
+    def __init__(self, intra_op_threads=None):
+        self.intra_op_threads = intra_op_threads
+        self.sessions = {}
+        self.errors = {}
+        self.ready = {}
+        self.ready_seconds = {}
+        self.lock = threading.Lock()
+
+    def load(self, model, on_ready=None):
+        """Start loading ``model`` unless it already is; ``on_ready(model, seconds, error)`` runs when done."""
+        with self.lock:
+            if model in self.ready:
+                if on_ready and self.ready[model].is_set():
+                    on_ready(model, self.ready_seconds.get(model), self.errors.get(model))
+                return
+            self.ready[model] = threading.Event()
+        threading.Thread(target=self._load, args=(model, on_ready), daemon=True).start()
+
+    def _load(self, model, on_ready):
+        start_time = time.perf_counter()
+        error = None
+        try:
+            session = create_session(model, self.intra_op_threads)
+            warm_up(session)
+            self.sessions[model] = session
+        except Exception as e:
+            error = self.errors[model] = e
+        self.ready_seconds[model] = time.perf_counter() - start_time
+        self.ready[model].set()
+        if on_ready:
+            on_ready(model, self.ready_seconds[model], error)
+
+    def get(self, model):
+        self.load(model)
+        self.ready[model].wait()
+        if model in self.errors:
+            raise self.errors[model]
+        return self.sessions[model]
+
+
+def image_digest(image):
+    """Hash of an image's pixels, so re-saved or renamed copies still match."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.mode}|{image.size}|".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def upright(image):
+    """``image`` turned the way its EXIF orientation says, as rembg.remove() does before inference."""
+    if image.getexif().get(0x0112, 1) == 1:  # Orientation tag
+        return image
+    return ImageOps.exif_transpose(image)
+
+
+def compose(image, mask):
+    """Cut ``image`` out with an alpha ``mask`` the way rembg does."""
+    image = image.convert("RGBA")
+    return Image.composite(image, Image.new("RGBA", image.size, 0), mask)
+
+
+def guided_upsample(mask, guide_small, guide, radius=GUIDED_RADIUS, eps=GUIDED_EPS):
+    """Upsample a low-resolution mask to the size of ``guide``, snapping its edges to the guide's.
+
+    ``mask`` and ``guide_small`` are uint8 arrays of the same small size,
+    ``guide`` the full-resolution uint8 grey image. This is the fast guided
+    filter: the local linear model ``mask = a * guide + b`` is fitted on the
+    small copies with box filters, and only ``a`` and ``b`` are interpolated
+    up, band by band, so the full-size work is one multiply-add per pixel and
+    memory beyond the result stays a few bands.
+    """
+    size = (2 * radius + 1, 2 * radius + 1)
+    small_guide = guide_small.astype(np.float32) / 255
+    small_mask = mask.astype(np.float32) / 255
+    mean_guide = cv2.blur(small_guide, size)
+    mean_mask = cv2.blur(small_mask, size)
+    covariance = cv2.blur(small_guide * small_mask, size) - mean_guide * mean_mask
+    variance = cv2.blur(small_guide * small_guide, size) - mean_guide * mean_guide
+    a = covariance / (variance + eps)
+    b = mean_mask - a * mean_guide
+    a = cv2.blur(a, size) * 255
+    b = cv2.blur(b, size) * 255
+
+    height, width = guide.shape
+    small_height, small_width = mask.shape
+    # Source coordinates of pixel centres, as cv2.resize maps them
+    map_x = (np.arange(width, dtype=np.float32) + 0.5) * (small_width / width) - 0.5
+    result = np.empty((height, width), np.uint8)
+    for top in range(0, height, UPSAMPLE_BAND_ROWS):
+        bottom = min(top + UPSAMPLE_BAND_ROWS, height)
+        map_y = (np.arange(top, bottom, dtype=np.float32) + 0.5) * (small_height / height) - 0.5
+        band_x, band_y = np.meshgrid(map_x, map_y)
+        band_a = cv2.remap(a, band_x, band_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        band_b = cv2.remap(b, band_x, band_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        band = band_a * (guide[top:bottom] / np.float32(255)) + band_b
+        np.clip(band + 0.5, 0, 255, out=band)
+        result[top:bottom] = band
+    return result
+
+
+def fast_mask(image, session, max_side=FAST_MAX_SIDE):
+    """Alpha mask of ``image`` inferred on a copy at most ``max_side`` pixels on its longer side.
+
+    rembg resizes its input to the model size anyway, so the small copy
+    loses little; the guided filter puts the edges back where the full
+    image has them. Like rembg, the mask is for the image turned upright.
+    """
+    image = upright(image)
+    scale = min(1.0, max_side / max(image.size))
+    small_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    small = image.resize(small_size, Image.Resampling.BILINEAR, reducing_gap=2.0).convert("RGB")
+    # The copy carries the EXIF over; without it rembg cannot turn the copy again
+    small.info.pop("exif", None)
+    mask = remove(small, session=session, only_mask=True)
+    if small.size == image.size:
+        return mask
+    guide = np.asarray(image.convert("L"))
+    return Image.fromarray(guided_upsample(np.asarray(mask), np.asarray(small.convert("L")), guide))
+
+
+class MaskCache:
+    """On-disk cache of alpha masks, bounded in size with least-recently-used eviction.
+
+    Masks are stored as single-channel PNGs, keyed by the image content,
+    the model and the alpha matting options. A hit only costs hashing the
+    pixels and decoding the mask. Every hit refreshes the file's mtime, and
+    once the cache grows past ``max_bytes`` the files with the oldest mtime
+    are deleted. Safe to share between threads.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory)
+                               if entry.name.endswith(".png"))
+
+    def key(self, image, model, options):
+        settings = json.dumps([model, options], sort_keys=True)
+        return hashlib.blake2b(f"{image_digest(image)}|{settings}".encode("utf-8"), digest_size=20).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".png")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with Image.open(path) as mask:
+                mask.load()
+            os.utime(path)  # most recently used
+            return mask
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, mask):
+        path = self.path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        mask.save(temp_path, format="PNG", optimize=False, compress_level=6)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".png")),
+                         key=lambda entry: entry.stat().st_mtime)
+        self.total_bytes = sum(entry.stat().st_size for entry in entries)
+        # Trim to 90% so eviction does not run again on the very next put
+        for entry in entries:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.total_bytes -= size
+            except FileNotFoundError:
+                pass
+
+
+def remove_cached(image, session, model, cache=None, alpha_matting=False, fast=False):
+    """rembg.remove() through a MaskCache; runs the model only on a cache miss.
+
+    With ``fast`` the mask comes from fast_mask() instead, and alpha matting
+    is not applied (the guided filter already refines the edges). Alpha
+    matting results are never cached: rembg also re-estimates the
+    foreground colours, which a cached mask cannot reproduce.
+    """
+    # rembg returns the upright image, so the mask and the cache key must use it too
+    image = upright(image)
+    if alpha_matting and not fast:
+        cache = None
+    if fast:
+        options = {"fast": FAST_MAX_SIDE, "radius": GUIDED_RADIUS, "eps": GUIDED_EPS}
+    else:
+        options = ALPHA_MATTING if alpha_matting else {}
+
+    def infer():
+        if fast:
+            mask = fast_mask(image, session)
+            return compose(image, mask), mask
+        result = remove(image, session=session, **options)
+        return result, result.getchannel("A")
+
+    if cache is None:
+        return infer()[0]
+    key = cache.key(image, model, options)
+    mask = cache.get(key)
+    if mask is not None:
+        return compose(image, mask)
+    result, mask = infer()
+    cache.put(key, mask)
+    return result
+
+
+def output_path_for(source_path, output_dir):
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(source_path))[0] + ".png")
+
+
+def is_up_to_date(source_path, output_path):
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+
+
+def remove_directory(input_dir, output_dir, model=DEFAULT_MODEL, workers=2, intra_op_threads=None,
+                     force=False, progress=None, cache=None, alpha_matting=False, fast=False):
+    """Remove the background of every image in ``input_dir`` into PNGs in ``output_dir``.
+
+    A reader thread decodes images into a queue of ``2 * workers`` entries,
+    so only a few images are ever in memory, and ``workers`` threads each
+    run their own session with ``intra_op_threads`` threads (default: the
+    cores divided between them). Every result is written as soon as it is
+    done; outputs newer than their source are skipped unless ``force`` is
+    set, so an interrupted run resumes where it stopped. With a MaskCache,
+    images seen before (under any name) skip inference. ``fast`` infers
+    masks at low resolution (see fast_mask()).
+    ``progress(done, total, images_per_second, eta_seconds)`` is called
+    after every image. Returns a dict of counts, seconds and images/s.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = []
+    skipped = 0
+    for name in sorted(os.listdir(input_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        source_path = os.path.join(input_dir, name)
+        output_path = output_path_for(source_path, output_dir)
+        if not force and is_up_to_date(source_path, output_path):
+            skipped += 1
+        else:
+            jobs.append((source_path, output_path))
+
+    workers = max(1, min(workers, len(jobs)))
+    intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // workers)
+    # Load every session up front so a bad model fails before any work starts
+    sessions = [create_session(model, intra_op_threads) for _ in range(workers if jobs else 0)]
+
+    pending = queue.Queue(maxsize=2 * workers)
+    counts = {"processed": 0, "failed": 0}
+    lock = threading.Lock()
+    start_time = time.perf_counter()
+
+    def finished(source_path, error=None):
+        with lock:
+            counts["failed" if error else "processed"] += 1
+            done = counts["processed"] + counts["failed"]
+        if error:
+            print(f"Error processing {source_path}: {error}")
+        if progress:
+            rate = done / max(time.perf_counter() - start_time, 1e-9)
+            progress(done, len(jobs), rate, (len(jobs) - done) / rate)
+
+    def read():
+        for source_path, output_path in jobs:
+            try:
+                image = Image.open(source_path)
+                image.load()
+            except Exception as e:
+                finished(source_path, e)
+                continue
+            pending.put((source_path, output_path, image))
+        for _ in sessions:
+            pending.put(None)
+
+    def work(session):
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            source_path, output_path, image = item
+            try:
+                result = remove_cached(image, session, model, cache, alpha_matting, fast)
+                temp_path = os.path.splitext(output_path)[0] + ".part.png"
+                result.save(temp_path)
+                os.replace(temp_path, output_path)
+                finished(source_path)
+            except Exception as e:
+                finished(source_path, e)
+
+    threads = [threading.Thread(target=read, daemon=True)]
+    threads += [threading.Thread(target=work, args=(session,), daemon=True) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "processed": counts["processed"],
+        "skipped": skipped,
+        "failed": counts["failed"],
+        "seconds": elapsed,
+        "images_per_second": counts["processed"] / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove the background of every image in a folder.")
+    parser.add_argument("input_dir", help="folder of images")
+    parser.add_argument("output_dir", help="folder for the transparent PNGs")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, choices=MODELS, help="rembg model")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="parallel inference sessions (default: 2)")
+    parser.add_argument("--threads", type=int, help="ONNX Runtime threads per session (default: cores / workers)")
+    parser.add_argument("--force", action="store_true", help="reprocess images that are already done")
+    parser.add_argument("--alpha-matting", action="store_true", help="refine mask edges with alpha matting")
+    parser.add_argument("--fast", action="store_true",
+                        help=f"infer masks at {FAST_MAX_SIDE}px and upsample them (much faster on large photos)")
+    parser.add_argument("--no-cache", action="store_true", help=f"do not use the mask cache in {CACHE_DIR}")
+    args = parser.parse_args(argv)
+
+    stats = remove_directory(args.input_dir, args.output_dir, args.model, args.workers, args.threads,
+                             args.force, cache=None if args.no_cache else MaskCache(),
+                             alpha_matting=args.alpha_matting, fast=args.fast,
+                             progress=lambda done, total, rate, eta: print(
+                                 f"\r{done}/{total} images, {rate:.1f} images/s, ETA {format_eta(eta)}",
+                                 end="", flush=True))
+    print(f"\nProcessed {stats['processed']} images ({stats['skipped']} skipped, {stats['failed']} failed) "
+          f"in {stats['seconds']:.1f}s ({stats['images_per_second']:.1f} images/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# pip install rembg Pillow
+
+import argparse
+import collections
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from background_remover import DEFAULT_MODEL, MODELS, MaskCache, create_session, remove_cached, warm_up
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+# Latency percentiles are computed over this many most recent requests
+LATENCY_SAMPLES = 1000
+
+
+class Job:
+    """One request waiting for a worker; ``done`` is set once ``result`` or ``error`` is."""
+
+    def __init__(self, key, image, alpha_matting, fast):
+        self.key = key
+        self.image = image
+        self.alpha_matting = alpha_matting
+        self.fast = fast
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SessionPool:
+    """``size`` warm sessions of one model, each on its own worker thread, fed from one queue.
+
+    Each worker takes the oldest request together with every queued request
+    for the same image bytes and options, which share a single inference.
+    rembg runs one image per inference, so different images are never
+    batched onto one session while the others could take them.
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, size=2, intra_op_threads=None, cache=None, metrics=None):
+        self.model = model
+        self.cache = cache
+        self.metrics = metrics
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.busy = 0
+        self.loading = size
+        self.ready = threading.Event()
+        self.errors = []
+        intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // size)
+        for _ in range(size):
+            threading.Thread(target=self._work, args=(intra_op_threads,), daemon=True).start()
+
+    def wait_ready(self):
+        """Block until every session is loaded and warmed up; re-raises a load error."""
+        self.ready.wait()
+        if self.errors:
+            raise self.errors[0]
+
+    def _loaded(self):
+        with self.condition:
+            self.loading -= 1
+            if not self.loading:
+                self.ready.set()
+
+    @property
+    def depth(self):
+        """Requests queued or being processed."""
+        with self.condition:
+            return len(self.pending) + self.busy
+
+    def submit(self, key, image, alpha_matting=False, fast=False):
+        job = Job(key, image, alpha_matting, fast)
+        with self.condition:
+            self.pending.append(job)
+            self.condition.notify()
+        job.done.wait()
+        if job.error:
+            raise job.error
+        return job.result
+
+    def _take(self):
+        """Wait for the oldest request and take it with the queued requests identical to it."""
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            first = self.pending.popleft()
+            same = (first.key, first.alpha_matting, first.fast)
+            batch = [first] + [job for job in self.pending if (job.key, job.alpha_matting, job.fast) == same]
+            for job in batch[1:]:
+                self.pending.remove(job)
+            self.busy += len(batch)
+            return batch
+
+    def _finish(self, batch, result=None, error=None):
+        for job in batch:
+            job.result, job.error = result, error
+            job.done.set()
+        with self.condition:
+            self.busy -= len(batch)
+
+    def _work(self, intra_op_threads):
+        try:
+            session = create_session(self.model, intra_op_threads)
+            warm_up(session)
+        except Exception as e:
+            self.errors.append(e)
+            self._loaded()
+            # Fail requests instead of leaving them waiting
+            while True:
+                self._finish(self._take(), error=e)
+        self._loaded()
+
+        while True:
+            batch = self._take()
+            if self.metrics:
+                self.metrics.record_batch(len(batch))
+            first = batch[0]
+            try:
+                result = remove_cached(first.image, session, self.model, self.cache,
+                                       first.alpha_matting, first.fast)
+            except Exception as e:
+                self._finish(batch, error=e)
+            else:
+                self._finish(batch, result)
+
+
+class Metrics:
+    """Request counts, latency percentiles and batch sizes; safe to share between threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+
+    def record_request(self, seconds, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += bool(error)
+            self.latencies.append(seconds)
+
+    def record_batch(self, size):
+        with self.lock:
+            self.batches += 1
+            self.batched_requests += size
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            snapshot = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            }
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+        snapshot["latency_p50_ms"] = percentile(0.50)
+        snapshot["latency_p99_ms"] = percentile(0.99)
+        return snapshot
+
+
+class BackgroundService:
+    """A SessionPool per model, created the first time a model is asked for."""
+
+    def __init__(self, models=(DEFAULT_MODEL,), pool_size=2, intra_op_threads=None, cache=None):
+        self.pool_size = pool_size
+        self.intra_op_threads = intra_op_threads
+        self.cache = cache
+        self.metrics = Metrics()
+        self.pools = {}
+        self.lock = threading.Lock()
+        for model in models:
+            self.pool(model)
+
+    def pool(self, model):
+        if model not in MODELS:
+            raise ValueError(f"Unknown model {model}")
+        with self.lock:
+            if model not in self.pools:
+                self.pools[model] = SessionPool(model, self.pool_size, self.intra_op_threads,
+                                                self.cache, self.metrics)
+            return self.pools[model]
+
+    def remove(self, data, model=DEFAULT_MODEL, alpha_matting=False, fast=False):
+        """Background-removed PNG bytes for encoded image ``data``."""
+        pool = self.pool(model)
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except OSError:
+            raise ValueError("The request body is not a readable image") from None
+        key = hashlib.blake2b(data, digest_size=20).hexdigest()
+        result = pool.submit(key, image, alpha_matting, fast)
+        output = io.BytesIO()
+        result.save(output, format="PNG", compress_level=1)
+        return output.getvalue()
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        with self.lock:
+            pools = dict(self.pools)
+        stats["queue_depth"] = {model: pool.depth for model, pool in pools.items()}
+        return stats
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """POST /remove?model=&alpha_matting=&fast= with an image body; GET /metrics and /health."""
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path == "/metrics":
+            self.send_json(self.server.service.stats())
+        elif path == "/health":
+            self.send_json({"models": sorted(self.server.service.pools)})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/remove":
+            self.send_json({"error": "not found"}, 404)
+            return
+        start_time = time.perf_counter()
+        query = urllib.parse.parse_qs(url.query)
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            png = self.server.service.remove(
+                data,
+                query.get("model", [DEFAULT_MODEL])[0],
+                query.get("alpha_matting", ["0"])[0] == "1",
+                query.get("fast", ["0"])[0] == "1",
+            )
+        except ValueError as e:
+            # Unreadable image or unknown model
+            self.server.service.metrics.record_request(time.perf_counter() - start_time, error=True)
+            self.send_json({"error": str(e)}, 400)
+            return
+        except Exception as e:
+            self.server.service.metrics.record_request(time.perf_counter() - start_time, error=True)
+            self.send_json({"error": str(e)}, 500)
+            return
+        self.server.service.metrics.record_request(time.perf_counter() - start_time)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(png)))
+        self.end_headers()
+        self.wfile.write(png)
+
+    def send_json(self, value, status=200):
+        body = json.dumps(value).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per request would drown the console
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Create the HTTP server for ``service``; call serve_forever() on it to run."""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def service_available(url=DEFAULT_URL, timeout=0.5):
+    """True if a service answers at ``url``."""
+    try:
+        with urllib.request.urlopen(f"{url}/health", timeout=timeout):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+def remove_remote(data, model=DEFAULT_MODEL, alpha_matting=False, fast=False, url=DEFAULT_URL, timeout=600):
+    """Send encoded image ``data`` to a running service and return the RGBA result.
+
+    Raises ConnectionError if no service is listening at ``url``.
+    """
+    query = urllib.parse.urlencode({"model": model, "alpha_matting": int(alpha_matting), "fast": int(fast)})
+    request = urllib.request.Request(f"{url}/remove?{query}", data=data,
+                                     headers={"Content-Type": "application/octet-stream"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = Image.open(io.BytesIO(response.read()))
+            result.load()
+            return result
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.loads(e.read() or b"{}").get("error", str(e))) from None
+    except urllib.error.URLError as e:
+        raise ConnectionError(f"No background removal service at {url} "
+                              f"(start one with: python background_service.py)") from e
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve background removal over HTTP on this machine.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("-m", "--model", action="append", choices=MODELS,
+                        help=f"model to load at startup; repeatable (default: {DEFAULT_MODEL})")
+    parser.add_argument("-j", "--sessions", type=int, default=2, help="warm sessions per model (default: 2)")
+    parser.add_argument("--threads", type=int, help="ONNX Runtime threads per session (default: cores / sessions)")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the mask cache")
+    args = parser.parse_args(argv)
+
+    service = BackgroundService(args.model or [DEFAULT_MODEL], args.sessions, args.threads,
+                                None if args.no_cache else MaskCache())
+    for model, pool in service.pools.items():
+        pool.wait_ready()
+        print(f"{model}: {args.sessions} session(s) ready")
+    server = serve(service, args.host, args.port)
+    print(f"Listening on http://{args.host}:{args.port} (POST /remove, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
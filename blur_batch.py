@@ -0,0 +1,134 @@
+# pip install opencv-python numpy Pillow
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+from PIL import Image
+
+from blur_engine import load_template, render_file, template_operations
+from face_detect import DETECTION_ERROR, cached_detect_zones, check_detection
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".ppm", ".webp")
+
+# Fixed-camera frames can be large scans too
+Image.MAX_IMAGE_PIXELS = None
+
+
+def _init_worker():
+    # One process per core already; OpenCV's own threads would only contend
+    cv2.setNumThreads(1)
+
+
+# Detected faces use the template's first blur, or this one if it has none
+DEFAULT_DETECT_BLUR = {"type": "Gaussian", "intensity": 0.02, "color": None, "angle": 0.0}
+
+
+def detect_operation(source_path, template, size):
+    """Operation blurring the faces found in ``source_path``, or None if there are none."""
+    zones = cached_detect_zones(source_path)
+    if not zones:
+        return None
+    settings = template["operations"][0] if template["operations"] else DEFAULT_DETECT_BLUR
+    operation = template_operations({"operations": [dict(settings, zones=[])]}, size)[0]
+    operation["zones"] = zones
+    return operation
+
+
+def blur_image(source_path, output_path, template, auto_detect=False):
+    """Apply a blur template to one image file, sized to that image."""
+    with Image.open(source_path) as image:
+        size = image.size
+    operations = template_operations(template, size)
+    if auto_detect:
+        operation = detect_operation(source_path, template, size)
+        if operation:
+            operations.append(operation)
+    render_file(source_path, output_path, operations)
+
+
+def is_up_to_date(source_path, output_path, template_path):
+    """True if ``output_path`` was written after both the source and the template changed."""
+    if not os.path.exists(output_path):
+        return False
+    output_time = os.path.getmtime(output_path)
+    return output_time >= os.path.getmtime(source_path) and output_time >= os.path.getmtime(template_path)
+
+
+def blur_directory(template_path, input_dir, output_dir, workers=None, force=False, auto_detect=False):
+    """Blur every image in ``input_dir`` into ``output_dir`` with a saved template.
+
+    Images are processed on a pool of ``workers`` processes (default: one per
+    core). With ``auto_detect``, each worker also blurs the faces it finds,
+    reusing cached detections for images seen before. Outputs that are newer
+    than their source and the template are skipped unless ``force`` is set.
+    Returns a dict of counts, elapsed seconds and images per second.
+    """
+    if auto_detect:
+        check_detection()  # fail once, not once per image
+    template = load_template(template_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = []
+    skipped = 0
+    for name in sorted(os.listdir(input_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        source_path = os.path.join(input_dir, name)
+        output_path = os.path.join(output_dir, name)
+        if not force and is_up_to_date(source_path, output_path, template_path):
+            skipped += 1
+        else:
+            jobs.append((source_path, output_path))
+
+    start_time = time.perf_counter()
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(blur_image, source_path, output_path, template, auto_detect): source_path
+                   for source_path, output_path in jobs}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"\nError processing {futures[future]}: {e}")
+            elapsed = time.perf_counter() - start_time
+            print(f"\r{done + failed}/{len(jobs)} images, {(done + failed) / elapsed:.1f} images/s",
+                  end="", flush=True)
+    if jobs:
+        print()
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "processed": done,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": elapsed,
+        "images_per_second": done / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a saved blur template to every image in a folder.")
+    parser.add_argument("template", help="template saved from the image blur tool")
+    parser.add_argument("input_dir", help="folder of images to anonymize")
+    parser.add_argument("output_dir", help="folder for the blurred images (same file names)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="reprocess images that are already up to date")
+    parser.add_argument("--auto-detect", action="store_true",
+                        help="also blur detected faces, with the template's first blur settings")
+    args = parser.parse_args(argv)
+    if args.auto_detect and DETECTION_ERROR:
+        parser.error(DETECTION_ERROR)
+
+    stats = blur_directory(args.template, args.input_dir, args.output_dir, args.jobs, args.force,
+                           args.auto_detect)
+    print(f"Processed {stats['processed']} images ({stats['skipped']} skipped, {stats['failed']} failed) "
+          f"in {stats['seconds']:.2f}s ({stats['images_per_second']:.1f} images/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# pip install opencv-python numpy Pillow
+
+import functools
+import json
+import math
+import os
+import shutil
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from tiled_image import MappedImage
+
+# Gaussian kernels up to this size are applied exactly; larger ones are
+# approximated by three box blurs, whose cost does not depend on the size.
+EXACT_GAUSSIAN_KERNEL = 15
+
+# Blurs wider than this many pixels run on a downscaled copy of the region
+# and are scaled back up, so even huge radii only touch a few pixels each.
+DOWNSCALE_KERNEL = 129
+
+# Uncompressed images at least this large are edited out of core: only the
+# blurred zones are ever read, and saving patches a copy of the file.
+TILED_MIN_PIXELS = 64_000_000
+
+# Motion kernels are applied with filter2D up to this size, above which OpenCV
+# switches to a much slower DFT path; longer streaks run on a downscaled copy.
+MAX_MOTION_KERNEL = 11
+
+
+def gaussian_sigma(kernel_size):
+    """The sigma OpenCV derives for a kernel size when given sigma=0."""
+    return 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
+
+
+def _box_widths(sigma, passes=3):
+    # Odd box widths whose repeated application has the variance of the Gaussian
+    ideal = math.sqrt(12 * sigma * sigma / passes + 1)
+    lower = int(ideal)
+    if lower % 2 == 0:
+        lower -= 1
+    lower = max(lower, 1)
+    upper = lower + 2
+    lower_count = round((12 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes)
+                        / (-4 * lower - 4))
+    return [lower if index < lower_count else upper for index in range(passes)]
+
+
+def _downscaled(img, factor, blur):
+    """Run ``blur`` on ``img`` shrunk by ``factor`` and resize the result back."""
+    height, width = img.shape[:2]
+    small_size = (max(1, round(width / factor)), max(1, round(height / factor)))
+    small = cv2.resize(img, small_size, interpolation=cv2.INTER_AREA)
+    return cv2.resize(blur(small), (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def box_blur(img, kernel_size):
+    """Average blur with a square kernel.
+
+    OpenCV's box filter keeps running column and row sums (a summed-area
+    table evaluated on the fly), so its cost per pixel is constant in the
+    kernel size.
+    """
+    if kernel_size <= 1:
+        return img.copy()
+    return cv2.blur(img, (kernel_size, kernel_size))
+
+
+def gaussian_blur(img, kernel_size):
+    """Gaussian blur with the same sigma as cv2.GaussianBlur(img, (k, k), 0).
+
+    Small kernels use OpenCV's exact separable filter. Larger ones use three
+    box blurs (constant time per pixel), and very large ones also run on a
+    downscaled copy.
+    """
+    if kernel_size <= 1:
+        return img.copy()
+    if kernel_size <= EXACT_GAUSSIAN_KERNEL:
+        return cv2.GaussianBlur(img, (kernel_size, kernel_size), 0)
+
+    height, width = img.shape[:2]
+    factor = kernel_size / (DOWNSCALE_KERNEL // 2)
+    if kernel_size > DOWNSCALE_KERNEL and min(height, width) / factor >= 2:
+        sigma = gaussian_sigma(kernel_size) / factor
+        return _downscaled(img, factor, lambda small: _box_gaussian(small, sigma))
+    return _box_gaussian(img, gaussian_sigma(kernel_size))
+
+
+def _box_gaussian(img, sigma):
+    for width in _box_widths(sigma):
+        img = cv2.blur(img, (width, width))
+    return img
+
+
+@functools.lru_cache(maxsize=128)
+def motion_kernel(size, angle=0.0):
+    """Normalised line kernel of ``size`` pixels at ``angle`` degrees, cached per (size, angle).
+
+    The returned array is read-only because it is shared between callers.
+    """
+    kernel = np.zeros((size, size), np.float32)
+    kernel[(size - 1) // 2, :] = 1.0
+    if angle % 180:
+        center = ((size - 1) / 2, (size - 1) / 2)
+        rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+        kernel = cv2.warpAffine(kernel, rotation, (size, size))
+    kernel /= kernel.sum()
+    kernel.flags.writeable = False
+    return kernel
+
+
+def motion_blur(img, kernel_size, angle=0.0):
+    """Linear motion blur of ``kernel_size`` pixels along ``angle`` degrees."""
+    if kernel_size <= 1:
+        return img.copy()
+    # Horizontal and vertical streaks are one-dimensional box blurs
+    if angle % 180 == 0:
+        return cv2.blur(img, (kernel_size, 1))
+    if angle % 180 == 90:
+        return cv2.blur(img, (1, kernel_size))
+
+    height, width = img.shape[:2]
+    factor = kernel_size / MAX_MOTION_KERNEL
+    if factor > 1 and min(height, width) / factor >= 2:
+        kernel = motion_kernel(MAX_MOTION_KERNEL, angle)
+        return _downscaled(img, factor, lambda small: cv2.filter2D(small, -1, kernel))
+    return cv2.filter2D(img, -1, motion_kernel(kernel_size, angle))
+
+
+def blur_region(roi, blur_type, intensity, color=None, angle=0.0):
+    """Blur an OpenCV BGR region; ``intensity`` is measured in pixels of that region's image."""
+    if blur_type == "Gaussian":
+        blurred_roi = gaussian_blur(roi, int(round(intensity)) * 2 + 1)
+    elif blur_type == "Motion":
+        blurred_roi = motion_blur(roi, max(1, int(round(intensity))), angle)
+    else:  # Average blur
+        blurred_roi = box_blur(roi, int(round(intensity)) * 2 + 1)
+
+    if color:
+        # Colour chooser gives RGB, the region is BGR
+        color_overlay = np.full_like(blurred_roi, tuple(reversed(color)))
+        alpha = 0.5
+        blurred_roi = cv2.addWeighted(blurred_roi, 1-alpha, color_overlay, alpha, 0)
+    return blurred_roi
+
+
+def operation_boxes(operation, scale=1.0):
+    """Integer boxes an operation's zones cover in an image ``scale`` times the source size."""
+    boxes = [tuple(int(round(value * scale)) for value in zone) for zone in operation["zones"]]
+    return [box for box in boxes if box[2] > box[0] and box[3] > box[1]]
+
+
+def blur_tile(tile, operation, scale=1.0):
+    """Blurred copy of a PIL RGB tile cut from an image ``scale`` times the source size."""
+    roi = cv2.cvtColor(np.asarray(tile), cv2.COLOR_RGB2BGR)
+    blurred_roi = blur_region(roi, operation["type"], operation["intensity"] * scale,
+                              operation["color"], operation.get("angle", 0.0))
+    return Image.fromarray(cv2.cvtColor(blurred_roi, cv2.COLOR_BGR2RGB))
+
+
+def apply_operation(image, operation, scale=1.0, undo_tiles=None):
+    """Apply a recorded blur operation to a PIL RGB image in place.
+
+    Operations store zones and intensity in source-image pixels; ``scale``
+    maps them onto a smaller proxy of the source. Only the zones are
+    converted to OpenCV arrays, never the whole image. Returns the boxes
+    that changed; if ``undo_tiles`` is a list, ``(box, pixels)`` for each box
+    is appended to it before the box is overwritten.
+    """
+    changed = []
+    for box in operation_boxes(operation, scale):
+        tile = image.crop(box)
+        if undo_tiles is not None:
+            undo_tiles.append((box, tile))
+        image.paste(blur_tile(tile, operation, scale), box[:2])
+        changed.append(box)
+    return changed
+
+
+def blur_halo(operation):
+    """Rows of context a blur needs beyond the pixels it changes, in source pixels."""
+    return int(round(operation["intensity"])) * 2 + 1
+
+
+def apply_operation_tiled(mapped_image, operation, max_pixels=16_000_000):
+    """Apply a recorded blur operation to a MappedImage in place, band by band.
+
+    Each zone is processed in horizontal bands of at most ``max_pixels``
+    pixels plus a halo of unblurred rows above and below, so memory scales
+    with the zone width rather than with the image, and the result matches
+    blurring the whole zone at once.
+    """
+    halo = blur_halo(operation)
+    for zone in operation["zones"]:
+        left, top, right, bottom = (int(round(value)) for value in zone)
+        if right <= left or bottom <= top:
+            continue
+        band_rows = max(1, max_pixels // (right - left))
+        above = np.empty((0, right - left, 3), np.uint8)  # original rows above the band
+        for band_top in range(top, bottom, band_rows):
+            band_bottom = min(band_top + band_rows, bottom)
+            below = min(band_bottom + halo, bottom)
+            band = mapped_image.read_region((left, band_top, right, below))
+            context = np.concatenate((above, band)) if len(above) else band
+
+            roi = cv2.cvtColor(context, cv2.COLOR_RGB2BGR)
+            blurred_roi = blur_region(roi, operation["type"], operation["intensity"],
+                                      operation["color"], operation.get("angle", 0.0))
+            changed = blurred_roi[len(above):len(above) + band_bottom - band_top]
+            mapped_image.write_region((left, band_top, right, band_bottom),
+                                      cv2.cvtColor(changed, cv2.COLOR_BGR2RGB))
+            # Later bands must see these rows as they were before blurring
+            above = np.concatenate((above, band[:band_bottom - band_top]))[-halo:]
+
+
+def make_template(operations, size):
+    """Turn operations in pixels of an image of ``size`` into a resolution-independent template.
+
+    Zones are stored as fractions of the image width and height and the
+    intensity as a fraction of the width, so the template fits any image.
+    """
+    width, height = size
+    return {
+        "version": 1,
+        "operations": [
+            {
+                "zones": [[left / width, top / height, right / width, bottom / height]
+                          for left, top, right, bottom in operation["zones"]],
+                "type": operation["type"],
+                "intensity": operation["intensity"] / width,
+                "color": list(operation["color"]) if operation["color"] else None,
+                "angle": operation.get("angle", 0.0),
+            }
+            for operation in operations
+        ],
+    }
+
+
+def template_operations(template, size):
+    """Operations of a template in pixels of an image of ``size``."""
+    width, height = size
+    return [
+        {
+            "zones": [(left * width, top * height, right * width, bottom * height)
+                      for left, top, right, bottom in operation["zones"]],
+            "type": operation["type"],
+            "intensity": operation["intensity"] * width,
+            "color": tuple(operation["color"]) if operation["color"] else None,
+            "angle": operation.get("angle", 0.0),
+        }
+        for operation in template["operations"]
+    ]
+
+
+def save_template(path, template):
+    with open(path, "w", encoding="utf-8") as template_file:
+        json.dump(template, template_file, indent=2)
+
+
+def load_template(path):
+    with open(path, encoding="utf-8") as template_file:
+        return json.load(template_file)
+
+
+def open_tiled(path):
+    """Return a MappedImage for a large uncompressed image, or None if it should be decoded."""
+    with Image.open(path) as image:
+        width, height = image.size
+    if width * height < TILED_MIN_PIXELS:
+        return None
+    try:
+        return MappedImage(path)
+    except ValueError:
+        return None  # compressed, so it has to be decoded in full
+
+
+def render_file(source_path, output_path, operations, source_image=None):
+    """Write ``source_path`` with ``operations`` applied to ``output_path``.
+
+    Large uncompressed sources saved in their own format are copied and
+    blurred in place, zone by zone; anything else is decoded (or taken from
+    ``source_image``) and re-encoded. The result is written under a
+    temporary name first, so ``output_path`` only ever holds a finished
+    image.
+    """
+    root, extension = os.path.splitext(output_path)
+    temp_path = f"{root}.part{extension}"
+    same_format = extension.lower() == os.path.splitext(source_path)[1].lower()
+    if source_image is None and same_format and open_tiled(source_path):
+        shutil.copyfile(source_path, temp_path)
+        result = MappedImage(temp_path, writable=True)
+        for operation in operations:
+            apply_operation_tiled(result, operation)
+        result.flush()
+        del result
+    else:
+        result_image = source_image.copy() if source_image else Image.open(source_path).convert("RGB")
+        for operation in operations:
+            apply_operation(result_image, operation)
+        result_image.save(temp_path)
+    os.replace(temp_path, output_path)
@@ -1,20 +1,38 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import base64
 import cv2
 import threading
 import time
 import os
+import queue
+
+from video_compress import compress_segmented
+from video_recorder import Recording
 
 class VideoRecorder:
-    def __init__(self):
+    """Tk front end for video_recorder.Recording; the widgets it updates are passed in.
+
+    For recording without any window, use video_recorder.record() or run
+    video_recorder.py from the command line.
+    """
+
+    def __init__(self, root, start_button, stop_button, status_label, preview_label=None):
+        self.root = root
+        self.start_button = start_button
+        self.stop_button = stop_button
+        self.status_label = status_label
+        self.preview_label = preview_label
+        self.preview_enabled = False
+        self.preview_photo = None
+        # Preview frames from the encoder thread, shown by a poll on the Tk thread
+        self.preview_frames = queue.Queue(maxsize=2)
         self.is_recording = False
-        self.cap = None
-        self.out = None
-        self.video_thread = None
+        self.recording = None
         self.output_dir = "" # Store output directory for potential reuse or access
         self.output_file = "" # Store output file path for potential reuse or access
 
-    def start_recording(self, duration_minutes, output_dir):
+    def start_recording(self, duration_minutes, output_dir, segment_minutes=0, keep_segments=0, motion=False):
         if self.is_recording:
             messagebox.showinfo("Info", "Recording is already in progress.")
             return
@@ -39,41 +57,21 @@ class VideoRecorder:
         self.output_file = os.path.join(output_dir, f"output_{timestamp}.avi")
 
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                raise IOError("Cannot open webcam")
-
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            fps = 20.0
-            frame_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                          int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
-            self.out = cv2.VideoWriter(self.output_file, fourcc, fps, frame_size)
-            if not self.out.isOpened():
-                raise IOError("Cannot open video writer")
-
+            # Capture and encoding run on their own threads, see video_recorder
+            # A segment length of 0 records a single file; otherwise the file rotates and
+            # only the last keep_segments files are kept (0 keeps them all)
+            self.recording = Recording(self.output_file, duration=duration_seconds,
+                                       on_preview=self.push_preview if self.preview_enabled else None,
+                                       segment_seconds=segment_minutes * 60 or None,
+                                       keep_segments=keep_segments or None,
+                                       motion=motion) # Only motion events are written
+            self.recording.start()
             self.is_recording = True
-
-            def record_video():
-                start_time = time.time()
-                while self.is_recording and (time.time() - start_time) < duration_seconds:
-                    ret, frame = self.cap.read()
-                    if ret:
-                        self.out.write(frame)
-                        cv2.imshow("Recording", frame)
-                    else:
-                        print("Error: Frame not captured. Stopping recording.") # For debugging in console
-                        messagebox.showerror("Camera Error", "Could not read frame from camera. Recording stopped.")
-                        break # Exit loop if frame not captured
-                    if cv2.waitKey(1) & 0xFF == ord('q'): # Allow manual quit from recording window (optional)
-                        self.stop_recording()
-                        break
-                self.stop_recording() # Ensure stop_recording is called when duration ends or loop breaks
-
-            self.video_thread = threading.Thread(target=record_video)
-            self.video_thread.start()
-            start_button.config(state=tk.DISABLED) # Disable start button during recording
-            stop_button.config(state=tk.NORMAL)   # Enable stop button during recording
-            status_label.config(text="Recording...", foreground="red") # Update status label
+            self.start_button.config(state=tk.DISABLED) # Disable start button during recording
+            self.stop_button.config(state=tk.NORMAL)   # Enable stop button during recording
+            self.status_label.config(text="Recording...", foreground="red") # Update status label
+            self.root.after(500, self.poll_recording)
+            self.root.after(100, self.poll_preview)
 
         except IOError as e:
             self.stop_recording() # Ensure resources are released even if start fails
@@ -85,26 +83,71 @@ class VideoRecorder:
             self.stop_recording()
             messagebox.showerror("Unexpected Error", f"An unexpected error occurred: {e}")
 
+    def poll_recording(self):
+        # Runs on the Tk thread until the duration ends or the camera fails
+        if not self.is_recording:
+            return
+        if self.recording.running:
+            stats = self.recording.stats()
+            self.status_label.config(text=f"Recording... {stats['fps']:.1f} fps, {stats['dropped']} dropped, "
+                                     f"{stats['duplicated']} duplicated, {stats['idle']} idle skipped")
+            self.root.after(500, self.poll_recording)
+        else:
+            self.stop_recording()
+
+    def set_preview(self, enabled):
+        # The recording only scales frames down for the preview while it is shown
+        self.preview_enabled = enabled
+        if self.recording:
+            self.recording.on_preview = self.push_preview if enabled else None
+        if not enabled and self.preview_label:
+            self.preview_label.config(image="")
+            self.preview_photo = None
 
-    def stop_recording(self):
+    def push_preview(self, frame):
+        # Called on the encoder thread a couple of times per second. Tk must not be
+        # called from here: stop_recording() blocks the Tk thread until this thread ends
+        ok, png = cv2.imencode(".png", frame)
+        if ok:
+            try:
+                self.preview_frames.put_nowait(base64.b64encode(png.tobytes()))
+            except queue.Full:
+                pass  # the Tk thread is behind; drop the frame
+
+    def poll_preview(self):
+        # Runs on the Tk thread while recording and shows the newest preview frame
+        data = None
+        while not self.preview_frames.empty():
+            data = self.preview_frames.get_nowait()
+        if data is not None:
+            self.show_preview(data)
         if self.is_recording:
-            self.is_recording = False
-            if self.video_thread and self.video_thread.is_alive():
-                self.video_thread.join() # Wait for the thread to finish
+            self.root.after(100, self.poll_preview)
 
-        if self.cap:
-            self.cap.release()
-            self.cap = None # Reset cap to None
+    def show_preview(self, data):
+        if self.preview_enabled and self.preview_label:
+            self.preview_photo = tk.PhotoImage(data=data)
+            self.preview_label.config(image=self.preview_photo)
 
-        if self.out:
-            self.out.release()
-            self.out = None # Reset out to None
+    def stop_recording(self):
+        was_recording = self.is_recording
+        self.is_recording = False
+        if self.recording:
+            self.recording.on_preview = None # No more preview frames while the Tk thread waits below
+            self.recording.stop() # Drains the frame buffer and closes the file
 
-        cv2.destroyAllWindows()
-        start_button.config(state=tk.NORMAL)  # Enable start button after recording stops
-        stop_button.config(state=tk.DISABLED) # Disable stop button after recording stops
-        status_label.config(text="Ready", foreground="green") # Update status label
-        messagebox.showinfo("Info", f"Recording stopped. Video saved to: {self.output_file}")
+        self.start_button.config(state=tk.NORMAL)  # Enable start button after recording stops
+        self.stop_button.config(state=tk.DISABLED) # Disable stop button after recording stops
+        self.status_label.config(text="Ready", foreground="green") # Update status label
+        if not was_recording:
+            return
+        if self.recording.error:
+            messagebox.showerror("Camera Error", f"{self.recording.error} Recording stopped.")
+        stats = self.recording.stats()
+        saved_to = self.recording.index_path if self.recording.rotating else self.output_file
+        messagebox.showinfo("Info", f"Recording stopped. Video saved to: {saved_to}\n"
+                                    f"{stats['written']} frames at {stats['fps']:.1f} fps, "
+                                    f"{stats['dropped']} dropped, {stats['duplicated']} duplicated")
 
 
 def start_recording_action():
@@ -112,46 +155,146 @@ def start_recording_action():
     output_dir = directory_entry.get()
     try:
         duration = int(duration_str)
-        recorder.start_recording(duration, output_dir)
+        segment_minutes = float(segment_entry.get() or 0)
+        keep_segments = int(keep_entry.get() or 0)
     except ValueError:
-        messagebox.showerror("Invalid Input", "Please enter a valid integer for duration.")
+        messagebox.showerror("Invalid Input", "Please enter valid numbers for duration and segments.")
+        return
+    recorder.start_recording(duration, output_dir, segment_minutes, keep_segments, motion_var.get())
 
 def stop_recording_action():
     recorder.stop_recording()
 
-# GUI Setup
-root = tk.Tk()
-root.title("Simple Video Recorder")
+def browse_input_action():
+    file_path = filedialog.askopenfilename(
+        filetypes=[("Video files", "*.avi *.mp4 *.mkv *.mov *.webm"), ("All files", "*.*")]
+    )
+    if file_path:
+        input_entry.delete(0, tk.END)
+        input_entry.insert(0, file_path)
+
+def compress_action():
+    input_path = input_entry.get() or recorder.output_file # Default to the last recording
+    if not input_path or not os.path.exists(input_path):
+        messagebox.showerror("Invalid Input", "Please choose a video to compress.")
+        return
+    try:
+        target_bytes = int(float(target_entry.get()) * 1_000_000)
+        if target_bytes <= 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("Invalid Input", "Please enter a positive target size in MB.")
+        return
+    output_path = os.path.splitext(input_path)[0] + "_compressed.mp4"
+    compress_button.config(state=tk.DISABLED)
+    compress_label.config(text="Estimating size from samples...")
+    for bar in segment_bars:
+        bar.destroy()
+    segment_bars.clear()
+    # ffmpeg runs off the Tk thread; progress comes back through root.after
+    threading.Thread(target=compress_worker, args=(input_path, output_path, target_bytes), daemon=True).start()
+
+def compress_worker(input_path, output_path, target_bytes):
+    try:
+        # Long videos are split at keyframes and encoded on every core
+        stats = compress_segmented(input_path, output_path, target_bytes,
+                                   progress=lambda fractions: root.after(0, show_segment_progress, fractions))
+        message = (f"Saved {output_path}: {stats['size'] / 1e6:.2f} MB in {stats['seconds']:.0f}s "
+                   f"(target {target_bytes / 1e6:.2f} MB, about {stats['estimate'] / 1e6:.1f} MB "
+                   f"needed for full quality)")
+    except Exception as e:
+        message = f"Error: {e}"
+    root.after(0, compress_finished, message)
+
+def show_segment_progress(fractions):
+    # One bar per segment, created when the first progress arrives
+    while len(segment_bars) < len(fractions):
+        bar = ttk.Progressbar(segments_frame, length=120, maximum=1.0)
+        bar.grid(row=len(segment_bars) // 4, column=len(segment_bars) % 4, padx=2, pady=1)
+        segment_bars.append(bar)
+    for bar, fraction in zip(segment_bars, fractions):
+        bar.config(value=fraction)
+    compress_label.config(text=f"Compressing {len(fractions)} segment(s)... "
+                               f"{sum(fractions) / len(fractions):.0%}")
+
+def compress_finished(message):
+    compress_button.config(state=tk.NORMAL)
+    compress_label.config(text=message)
+
+if __name__ == "__main__":
+    # GUI Setup
+    root = tk.Tk()
+    root.title("Simple Video Recorder")
+
+    # Duration Input
+    duration_label = ttk.Label(root, text="Duration (minutes):")
+    duration_label.grid(row=0, column=0, padx=10, pady=10, sticky=tk.W)
+    duration_entry = ttk.Entry(root, width=10)
+    duration_entry.grid(row=0, column=1, padx=10, pady=10, sticky=tk.W)
+    duration_entry.insert(0, "1") # Default duration of 1 minute
+
+    # Directory Input
+    directory_label = ttk.Label(root, text="Output Directory:")
+    directory_label.grid(row=1, column=0, padx=10, pady=10, sticky=tk.W)
+    directory_entry = ttk.Entry(root, width=40)
+    directory_entry.grid(row=1, column=1, padx=10, pady=10, sticky=tk.W)
+    directory_entry.insert(0, "videos") # Default directory
 
-recorder = VideoRecorder()
+    # Rolling segments
+    segment_label = ttk.Label(root, text="New File Every (minutes):")
+    segment_label.grid(row=2, column=0, padx=10, pady=10, sticky=tk.W)
+    segment_frame = ttk.Frame(root)
+    segment_frame.grid(row=2, column=1, padx=10, pady=10, sticky=tk.W)
+    segment_entry = ttk.Entry(segment_frame, width=10)
+    segment_entry.pack(side=tk.LEFT)
+    segment_entry.insert(0, "0") # 0 records a single file
+    ttk.Label(segment_frame, text="Keep Last:").pack(side=tk.LEFT, padx=(10, 5))
+    keep_entry = ttk.Entry(segment_frame, width=6)
+    keep_entry.pack(side=tk.LEFT)
+    keep_entry.insert(0, "0") # 0 keeps every segment
+    motion_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(segment_frame, text="Only When Motion", variable=motion_var).pack(side=tk.LEFT, padx=(10, 0))
 
-# Duration Input
-duration_label = ttk.Label(root, text="Duration (minutes):")
-duration_label.grid(row=0, column=0, padx=10, pady=10, sticky=tk.W)
-duration_entry = ttk.Entry(root, width=10)
-duration_entry.grid(row=0, column=1, padx=10, pady=10, sticky=tk.W)
-duration_entry.insert(0, "1") # Default duration of 1 minute
+    # Status Label
+    status_label = ttk.Label(root, text="Ready", foreground="green")
+    status_label.grid(row=3, column=0, columnspan=2, pady=5)
 
-# Directory Input
-directory_label = ttk.Label(root, text="Output Directory:")
-directory_label.grid(row=1, column=0, padx=10, pady=10, sticky=tk.W)
-directory_entry = ttk.Entry(root, width=40)
-directory_entry.grid(row=1, column=1, padx=10, pady=10, sticky=tk.W)
-directory_entry.insert(0, "videos") # Default directory
+    # Buttons Frame
+    buttons_frame = ttk.Frame(root)
+    buttons_frame.grid(row=4, column=0, columnspan=2, pady=10)
 
-# Status Label
-status_label = ttk.Label(root, text="Ready", foreground="green")
-status_label.grid(row=2, column=0, columnspan=2, pady=5)
+    start_button = ttk.Button(buttons_frame, text="Start Recording", command=start_recording_action)
+    start_button.pack(side=tk.LEFT, padx=10)
 
-# Buttons Frame
-buttons_frame = ttk.Frame(root)
-buttons_frame.grid(row=3, column=0, columnspan=2, pady=10)
+    stop_button = ttk.Button(buttons_frame, text="Stop Recording", command=stop_recording_action, state=tk.DISABLED) # Initially disabled
+    stop_button.pack(side=tk.LEFT, padx=10)
 
-start_button = ttk.Button(buttons_frame, text="Start Recording", command=start_recording_action)
-start_button.pack(side=tk.LEFT, padx=10)
+    # Low-rate preview, only produced while the box is ticked
+    preview_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(buttons_frame, text="Show Preview", variable=preview_var,
+                    command=lambda: recorder.set_preview(preview_var.get())).pack(side=tk.LEFT, padx=10)
+    preview_label = ttk.Label(root)
+    preview_label.grid(row=6, column=0, columnspan=2, pady=5)
 
-stop_button = ttk.Button(buttons_frame, text="Stop Recording", command=stop_recording_action, state=tk.DISABLED) # Initially disabled
-stop_button.pack(side=tk.LEFT, padx=10)
+    recorder = VideoRecorder(root, start_button, stop_button, status_label, preview_label)
 
+    # Compression of an existing video to a target size
+    compress_frame = ttk.LabelFrame(root, text="Compress Video", padding=10)
+    compress_frame.grid(row=5, column=0, columnspan=2, padx=10, pady=10, sticky=tk.EW)
+    ttk.Label(compress_frame, text="Input Video:").grid(row=0, column=0, sticky=tk.W)
+    input_entry = ttk.Entry(compress_frame, width=40)
+    input_entry.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
+    ttk.Button(compress_frame, text="Browse", command=browse_input_action).grid(row=0, column=2, padx=5)
+    ttk.Label(compress_frame, text="Target Size (MB):").grid(row=1, column=0, sticky=tk.W)
+    target_entry = ttk.Entry(compress_frame, width=10)
+    target_entry.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
+    target_entry.insert(0, "25")
+    compress_button = ttk.Button(compress_frame, text="Compress", command=compress_action)
+    compress_button.grid(row=2, column=0, columnspan=3, pady=5)
+    compress_label = ttk.Label(compress_frame, text="")
+    compress_label.grid(row=3, column=0, columnspan=3)
+    segments_frame = ttk.Frame(compress_frame)
+    segments_frame.grid(row=4, column=0, columnspan=3)
+    segment_bars = []
 
-root.mainloop()
+    root.mainloop()
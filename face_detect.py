@@ -0,0 +1,108 @@
+# pip install "opencv-python<5" numpy Pillow  (OpenCV 5 moved the Haar cascades to contrib)
+
+import functools
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from blur_engine import open_tiled
+
+# Bundled OpenCV Haar cascades used to propose blur zones
+CASCADES = ("haarcascade_frontalface_default.xml", "haarcascade_profileface.xml")
+
+# Detection runs on a copy whose longer side is at most this many pixels
+DETECT_MAX_SIDE = 1024
+
+# Detected boxes are grown by this fraction of their size on every side,
+# since the cascades frame faces tightly
+ZONE_MARGIN = 0.15
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "blur_detect")
+
+# OpenCV 5 moved the Haar cascades to the contrib package; None when detection works
+DETECTION_ERROR = None if hasattr(cv2, "CascadeClassifier") else (
+    f"Face detection needs the Haar cascades, which OpenCV {cv2.__version__} does not have; "
+    'install "opencv-python<5"')
+
+# Part of every cache key, so changing the settings above invalidates old results
+DETECTOR_KEY = f"{CASCADES}|{DETECT_MAX_SIDE}|{ZONE_MARGIN}|1.1|5"
+
+
+def file_digest(path):
+    """Content hash of an image file; detection results are cached under it."""
+    digest = hashlib.blake2b(DETECTOR_KEY.encode("utf-8"), digest_size=20)
+    with open(path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_detection():
+    """Raise RuntimeError if this OpenCV cannot detect faces."""
+    if DETECTION_ERROR:
+        raise RuntimeError(DETECTION_ERROR)
+
+
+@functools.lru_cache(maxsize=None)
+def _cascade(name):
+    return cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, name))
+
+
+def _detection_copy(path):
+    """Small RGB copy of an image for detection, and the factor back to full size."""
+    mapped = open_tiled(path)
+    if mapped:
+        small = mapped.proxy((DETECT_MAX_SIDE, DETECT_MAX_SIDE))
+        return small, mapped.width / small.width
+    with Image.open(path) as image:
+        width = image.width
+        # JPEGs decode straight at 1/2, 1/4 or 1/8 scale
+        image.draft("RGB", (DETECT_MAX_SIDE, DETECT_MAX_SIDE))
+        small = image.convert("RGB")
+    small.thumbnail((DETECT_MAX_SIDE, DETECT_MAX_SIDE), Image.Resampling.BILINEAR)
+    return small, width / small.width
+
+
+def detect_zones(path):
+    """Find faces in an image file and return blur zones in its full-resolution pixels."""
+    check_detection()
+    small, factor = _detection_copy(path)
+    gray = cv2.equalizeHist(cv2.cvtColor(np.asarray(small), cv2.COLOR_RGB2GRAY))
+
+    zones = []
+    for name in CASCADES:
+        for x, y, w, h in _cascade(name).detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5,
+                                                          minSize=(24, 24)):
+            margin_x, margin_y = w * ZONE_MARGIN, h * ZONE_MARGIN
+            zones.append((max(0.0, (x - margin_x) * factor),
+                          max(0.0, (y - margin_y) * factor),
+                          min(small.width, x + w + margin_x) * factor,
+                          min(small.height, y + h + margin_y) * factor))
+    return zones
+
+
+def cached_detect_zones(path, cache_dir=CACHE_DIR):
+    """detect_zones() with results cached on disk per image content.
+
+    Re-opening or re-running a batch over the same images only costs a hash
+    of each file. The cache is safe to share between worker processes.
+    """
+    digest = file_digest(path)
+    cache_path = os.path.join(cache_dir, digest[:2], digest + ".json")
+    try:
+        with open(cache_path, encoding="utf-8") as cache_file:
+            return [tuple(zone) for zone in json.load(cache_file)]
+    except (OSError, ValueError):
+        pass
+
+    zones = detect_zones(path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as cache_file:
+        json.dump(zones, cache_file)
+    os.replace(temp_path, cache_path)
+    return zones
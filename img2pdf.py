@@ -1,11 +1,749 @@
-from PIL import Image
-
-# Open the PNG image
-image = Image.open('image.jpg')
-
-# Convert to RGB (necessary for PNG with transparency)
-if image.mode == 'RGBA':
-    image = image.convert('RGB')
-
-# Save the image as a PDF
-image.save('output.pdf')
+# pip install Pillow
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+# Decoded pixels are compressed in horizontal strips of about this many bytes,
+# so only one page (plus one strip) is ever held uncompressed.
+STRIP_BYTES = 1 << 20
+
+PDF_COLORSPACES = {"L": "/DeviceGray", "RGB": "/DeviceRGB", "CMYK": "/DeviceCMYK"}
+
+# Portrait page sizes in points; landscape images get the page turned.
+PAGE_SIZES = {
+    "A3": (841.89, 1190.55),
+    "A4": (595.28, 841.89),
+    "A5": (419.53, 595.28),
+    "LETTER": (612.0, 792.0),
+    "LEGAL": (612.0, 1008.0),
+}
+
+# Resolutions below this are treated as missing, like Pillow's dpi=(1, 1) on
+# TIFFs without a unit, which would make pages beyond the PDF size limit.
+MIN_DPI = 20
+
+# Quality used when a downscaled JPEG has to be re-encoded.
+JPEG_QUALITY = 90
+
+# EXIF orientations that a page /Rotate can express; mirrored ones need a decode.
+EXIF_PAGE_ROTATION = {1: 0, 3: 180, 6: 90, 8: 270}
+
+# Baseline, extended and progressive Huffman JPEGs; every PDF reader decodes these.
+PASSTHROUGH_SOF_MARKERS = (0xC0, 0xC1, 0xC2)
+
+
+def natural_key(path):
+    """Sort key that orders page_2.jpg before page_10.jpg."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", path)]
+
+
+def expand_inputs(patterns):
+    """Turn image files, directories and glob patterns into an ordered list of paths."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                       if name.lower().endswith(IMAGE_EXTENSIONS)]
+        elif glob.has_magic(pattern):
+            matches = glob.glob(pattern)
+        else:
+            paths.append(pattern)
+            continue
+        paths.extend(sorted(matches, key=natural_key))
+    return paths
+
+
+def parse_page_size(value):
+    """Return a (width, height) page size in points from a name like "A4", or None."""
+    if value is None or isinstance(value, tuple):
+        return value
+    try:
+        return PAGE_SIZES[value.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown page size {value!r}; expected one of {', '.join(PAGE_SIZES)}") from None
+
+
+def _image_dpi(image):
+    dpi = image.info.get("dpi") or (72, 72)
+    return tuple(float(value) if value and value >= MIN_DPI else 72.0 for value in dpi[:2])
+
+
+def _to_8bit_gray(image):
+    """Scale a 16-bit, 32-bit or float grayscale image down to ``L``.
+
+    convert("L") would clip every value above 255 and turn a 16-bit scan
+    white. Values in the 16-bit (or, for floats, 0-1) range are scaled by
+    that range; anything else is stretched to the image's own extremes.
+    """
+    if image.mode.startswith("I;16"):
+        image = image.convert("I")
+    low, high = image.getextrema()
+    if image.mode == "I" and low >= 0 and high <= 65535:
+        low, high = 0, 65535
+    elif image.mode == "F" and low >= 0 and high <= 1:
+        low, high = 0, 1
+    scale = 255 / (high - low) if high > low else 0
+    return image.point(lambda value: value * scale - low * scale).convert("L")
+
+
+def _encode_flate(image):
+    compressor = zlib.compressobj(6)
+    bands = len(image.getbands())
+    rows = max(1, STRIP_BYTES // max(1, image.width * bands))
+    chunks = []
+    for top in range(0, image.height, rows):
+        strip = image.crop((0, top, image.width, min(top + rows, image.height)))
+        chunks.append(compressor.compress(strip.tobytes()))
+    chunks.append(compressor.flush())
+    return chunks
+
+
+def _jpeg_frame_header(data):
+    """Return (SOF marker, sample precision) of a JPEG stream, or None if unreadable."""
+    pos = 2
+    while pos + 4 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            pos += 2
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return marker, data[pos + 4]
+        else:
+            pos += 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+    return None
+
+
+def _layout(width, height, dpi, page_size):
+    """Return (image size on the page, page size), both in points.
+
+    Without a page size the page is the image's physical size. Otherwise the
+    page is turned to match the image's orientation and the image is scaled
+    to fit inside it, centred.
+    """
+    size = (width * 72.0 / dpi[0], height * 72.0 / dpi[1])
+    if page_size is None:
+        return size, size
+    page_width, page_height = page_size
+    if (width > height) != (page_width > page_height):
+        page_width, page_height = page_height, page_width
+    scale = min(page_width / size[0], page_height / size[1])
+    return (size[0] * scale, size[1] * scale), (page_width, page_height)
+
+
+def _target_pixels(size, target_dpi):
+    """Pixel size that gives ``target_dpi`` at ``size`` points, or None to keep full resolution."""
+    if not target_dpi:
+        return None
+    return tuple(max(1, math.ceil(points * target_dpi / 72.0)) for points in size)
+
+
+def _encode_jpeg(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=JPEG_QUALITY)
+    return [buffer.getvalue()]
+
+
+def _prepare_jpeg(path, image, page_size, target_dpi):
+    """Embed a JPEG file's bytes untouched as a DCTDecode stream.
+
+    Returns None when the file needs the decode path instead: unusual
+    colour modes, mirrored EXIF orientations, lossless, arithmetic-coded
+    and 12-bit JPEGs that PDF readers are not guaranteed to handle, or
+    images with more pixels than ``target_dpi`` asks for.
+    """
+    if image.format != "JPEG" or image.mode not in PDF_COLORSPACES:
+        return None
+    rotate = EXIF_PAGE_ROTATION.get(image.getexif().get(0x0112, 1))
+    if rotate is None:
+        return None
+    # The page /Rotate turns the whole page, so lay it out for the stored orientation.
+    size, page_box = _layout(image.width, image.height, _image_dpi(image), page_size)
+    target = _target_pixels(size, target_dpi)
+    if target and (image.width > target[0] or image.height > target[1]):
+        return None
+
+    with open(path, "rb") as jpeg_file:
+        data = jpeg_file.read()
+    frame = _jpeg_frame_header(data)
+    if frame is None or frame[0] not in PASSTHROUGH_SOF_MARKERS or frame[1] != 8:
+        return None
+
+    # Adobe CMYK JPEGs store inverted ink values.
+    decode = "[1 0 1 0 1 0 1 0]" if image.mode == "CMYK" and "adobe" in image.info else None
+    return {
+        "width": image.width,
+        "height": image.height,
+        "colorspace": PDF_COLORSPACES[image.mode],
+        "filter": "/DCTDecode",
+        "decode": decode,
+        "data": [data],
+        "size_pt": size,
+        "page_size": page_box,
+        "rotate": rotate,
+    }
+
+
+def prepare_page(path, passthrough=True, page_size=None, target_dpi=None):
+    """Return everything the writer needs to embed one image as a page.
+
+    JPEGs are embedded byte-for-byte when ``passthrough`` is set; anything
+    else is decoded and Flate-compressed. ``page_size`` is a (width, height)
+    in points to fit the image onto, and ``target_dpi`` caps the resolution
+    embedded for it. The returned page only holds compressed data, so a
+    whole document never needs more than one decoded bitmap in memory at a
+    time.
+    """
+    with Image.open(path) as image:
+        if passthrough:
+            page = _prepare_jpeg(path, image, page_size, target_dpi)
+            if page is not None:
+                return page
+
+        # Lay the page out for the image as it looks once EXIF-rotated.
+        orientation = image.getexif().get(0x0112, 1)
+        swap = orientation in (5, 6, 7, 8)
+        dpi = _image_dpi(image)
+        width, height = (image.height, image.width) if swap else image.size
+        size, page_box = _layout(width, height, dpi[::-1] if swap else dpi, page_size)
+
+        target = _target_pixels(size, target_dpi)
+        downscaled = bool(target) and (width > target[0] or height > target[1])
+        source_format = image.format
+        if downscaled:
+            # Draft mode makes the JPEG decoder work at 1/2, 1/4 or 1/8 scale,
+            # so a large photo is never decoded at full size; thumbnail() then
+            # halves with reduce() before the final resample.
+            stored_target = target[::-1] if swap else target
+            image.draft(image.mode, stored_target)
+            image.thumbnail(stored_target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        if orientation != 1:
+            image = ImageOps.exif_transpose(image)
+
+        # PDF image XObjects only know gray, RGB and CMYK; transparency is
+        # dropped the same way the single-image converter always did.
+        if image.mode in ("I", "F") or image.mode.startswith("I;16"):
+            image = _to_8bit_gray(image)
+        elif image.mode not in PDF_COLORSPACES:
+            image = image.convert("L" if image.mode in ("1", "LA") else "RGB")
+
+        page = {
+            "width": image.width,
+            "height": image.height,
+            "colorspace": PDF_COLORSPACES[image.mode],
+            "filter": "/FlateDecode",
+            "decode": None,
+            "size_pt": size,
+            "page_size": page_box,
+            "rotate": 0,
+        }
+        if downscaled and source_format == "JPEG":
+            # Resampled photos stay lossy; Flate would blow them up in size.
+            page.update(filter="/DCTDecode", data=_encode_jpeg(image),
+                        decode="[1 0 1 0 1 0 1 0]" if image.mode == "CMYK" else None)
+        else:
+            page["data"] = _encode_flate(image)
+        return page
+
+
+def file_digest(path):
+    """Content hash of a file, used to spot repeated input images."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stream_digest(page):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((page["width"], page["height"], page["colorspace"],
+                        page["filter"], page["decode"])).encode("ascii"))
+    for chunk in page["data"]:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prepare_pages(paths, workers=1, dedupe=True, known=(), errors=None, **options):
+    """Yield ``(file digest, page)`` pairs in input order.
+
+    ``options`` are passed on to prepare_page().
+    Pages are prepared on ``workers`` processes; 0 or None uses every core.
+    At most two pages per worker are in flight, so parallel runs keep the
+    same bounded memory as serial ones. With ``dedupe`` set, a file whose
+    content was already seen is not prepared again and yields ``page=None``;
+    without it the digest is always None. Digests in ``known`` count as
+    already seen. A file that cannot be read raises, unless ``errors`` is a
+    list: then ``(path, exception)`` is appended to it and the file (and
+    any repeat of it) is left out.
+    """
+    workers = workers or os.cpu_count() or 1
+    seen = set(known)
+    failed = {}
+
+    def is_repeat(key):
+        if key is None or key not in seen:
+            seen.add(key)
+            return False
+        return True
+
+    def failure(path, key, error):
+        if errors is None:
+            raise error
+        errors.append((path, error))
+        if key is not None:
+            failed[key] = error
+
+    if workers == 1:
+        for path in paths:
+            key = None
+            try:
+                key = file_digest(path) if dedupe else None
+                if key in failed:
+                    raise failed[key]
+                page = None if is_repeat(key) else prepare_page(path, **options)
+            except Exception as e:
+                failure(path, key, e)
+                continue
+            yield key, page
+        return
+
+    def collect(path, key, future):
+        try:
+            if future is None:
+                if key in failed:
+                    raise failed[key]
+                return key, None
+            return key, future.result()
+        except Exception as e:
+            failure(path, key, e)
+            return None
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        try:
+            for path in paths:
+                try:
+                    key = file_digest(path) if dedupe else None
+                except OSError as e:
+                    failure(path, None, e)
+                    continue
+                future = None if is_repeat(key) else pool.submit(prepare_page, path, **options)
+                pending.append((path, key, future))
+                if len(pending) >= 2 * workers:
+                    result = collect(*pending.popleft())
+                    if result:
+                        yield result
+            while pending:
+                result = collect(*pending.popleft())
+                if result:
+                    yield result
+        finally:
+            for _, _, future in pending:
+                if future:
+                    future.cancel()
+
+
+class PdfStreamWriter:
+    """Minimal PDF writer that writes every page as soon as it is added.
+
+    Objects 1 and 2 are reserved for the catalog and the page tree. They are
+    written by close() once all page ids are known, so apart from the object
+    offsets nothing accumulates in memory while pages are streamed out.
+
+    Given the ``state()`` of an earlier writer and a file positioned at the
+    end of that PDF, new pages are appended as an incremental update: only
+    the new objects, a new page tree and an xref section chained to the
+    previous one with /Prev are written.
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, fileobj, state=None):
+        self.file = fileobj
+        self.offsets = {}
+        if state is None:
+            self.page_ids = []
+            self.next_id = 3
+            self.prev_xref = None
+            self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        else:
+            self.page_ids = list(state["page_ids"])
+            self.next_id = state["next_id"]
+            self.prev_xref = state["startxref"]
+
+    def _new_id(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, dictionary, stream=None):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % obj_id)
+        self.file.write(dictionary.encode("ascii"))
+        if stream is not None:
+            self.file.write(b"\nstream\n")
+            for chunk in stream:
+                self.file.write(chunk)
+            self.file.write(b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def add_image(self, page):
+        """Write an image XObject for a prepared page and return its object id."""
+        obj_id = self._new_id()
+        length = sum(len(chunk) for chunk in page["data"])
+        entries = [
+            "/Type /XObject", "/Subtype /Image",
+            f"/Width {page['width']}", f"/Height {page['height']}",
+            f"/ColorSpace {page['colorspace']}", "/BitsPerComponent 8",
+            f"/Filter {page['filter']}", f"/Length {length}",
+        ]
+        if page["decode"]:
+            entries.append(f"/Decode {page['decode']}")
+        self._write_object(obj_id, "<< " + " ".join(entries) + " >>", page["data"])
+        return obj_id
+
+    def add_page(self, page, image_id=None):
+        """Write a page showing the prepared image, embedding it first if needed."""
+        if image_id is None:
+            image_id = self.add_image(page)
+        image_width, image_height = page["size_pt"]
+        page_width, page_height = page["page_size"]
+        left = (page_width - image_width) / 2
+        bottom = (page_height - image_height) / 2
+
+        content = b"q %.4f 0 0 %.4f %.4f %.4f cm /Im0 Do Q" % (image_width, image_height, left, bottom)
+        content_id = self._new_id()
+        self._write_object(content_id, f"<< /Length {len(content)} >>", [content])
+
+        page_id = self._new_id()
+        rotate = f" /Rotate {page['rotate']}" if page["rotate"] else ""
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R"
+            f" /MediaBox [0 0 {page_width:.4f} {page_height:.4f}]"
+            f" /Resources << /XObject << /Im0 {image_id} 0 R >> >>"
+            f" /Contents {content_id} 0 R{rotate} >>",
+        )
+        self.page_ids.append(page_id)
+        return page_id
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._write_object(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        if self.prev_xref is None:
+            self._write_object(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>")
+
+        # One xref subsection per run of consecutive object ids; an update
+        # only lists the objects it (re)wrote, plus the free-list head that
+        # readers expect every section to start with.
+        obj_ids = [0] + sorted(self.offsets)
+        xref_offset = self.file.tell()
+        self.file.write(b"xref\n")
+        run_start = 0
+        for index in range(1, len(obj_ids) + 1):
+            if index < len(obj_ids) and obj_ids[index] == obj_ids[index - 1] + 1:
+                continue
+            self.file.write(b"%d %d\n" % (obj_ids[run_start], index - run_start))
+            for obj_id in obj_ids[run_start:index]:
+                if obj_id == 0:
+                    self.file.write(b"0000000000 65535 f \n")
+                else:
+                    self.file.write(b"%010d 00000 n \n" % self.offsets[obj_id])
+            run_start = index
+
+        prev = b" /Prev %d" % self.prev_xref if self.prev_xref is not None else b""
+        self.file.write(b"trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n"
+                        % (self.next_id, self.CATALOG_ID, prev, xref_offset))
+        self.prev_xref = xref_offset
+        self.offsets = {}
+
+    def state(self):
+        """What a later writer needs to append to this PDF after close()."""
+        return {"startxref": self.prev_xref, "next_id": self.next_id, "page_ids": list(self.page_ids)}
+
+
+def _write_pages(writer, prepared, images):
+    """Add prepared pages to ``writer`` and return how many images were embedded.
+
+    ``images`` maps file and stream digests to (image id, page without its
+    data) and is updated in place, so repeats share one image XObject; pass
+    None to embed every page's image.
+    """
+    unique_images = 0
+    for key, page in prepared:
+        if page is None:
+            image_id, page = images[key]
+        else:
+            stream_key = _stream_digest(page) if images is not None else None
+            if images is not None and stream_key in images:
+                image_id = images[stream_key][0]
+            else:
+                image_id = writer.add_image(page)
+                unique_images += 1
+            page = dict(page, data=None)
+            if images is not None:
+                images[key] = images[stream_key] = (image_id, page)
+        writer.add_page(page, image_id)
+    return unique_images
+
+
+def convert(paths, output_path, passthrough=True, workers=1, dedupe=True,
+            page_size=None, target_dpi=None):
+    """Write every image in ``paths`` as one page of ``output_path``, in order.
+
+    Pages are decoded, compressed and written one at a time, so peak memory
+    stays around the size of a single decoded page however long the list is.
+    JPEGs are copied into the PDF without being decoded unless
+    ``passthrough`` is False. With ``workers`` other than 1, decoding and
+    compression run on a process pool while pages are still written in
+    input order. With ``dedupe`` set, identical inputs (same file content,
+    or the same pixels once encoded) are embedded once as a shared image
+    XObject that every repeat page points at, and repeated files are not
+    decoded again.
+
+    ``page_size`` (a name from PAGE_SIZES or a (width, height) in points)
+    fits every image onto pages of that size; otherwise each page takes the
+    image's physical size. ``target_dpi`` downsamples larger images to that
+    resolution on the page, decoding JPEGs at reduced scale to save time and
+    memory.
+
+    Returns a dict with the page count, the number of embedded images,
+    elapsed seconds and pages per second.
+    """
+    paths = list(paths)
+    page_size = parse_page_size(page_size)
+    if not paths:
+        raise ValueError("No input images to convert")
+
+    start_time = time.perf_counter()
+    with open(output_path, "wb") as output_file:
+        writer = PdfStreamWriter(output_file)
+        prepared = prepare_pages(paths, workers, dedupe, passthrough=passthrough,
+                                 page_size=page_size, target_dpi=target_dpi)
+        unique_images = _write_pages(writer, prepared, {} if dedupe else None)
+        writer.close()
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "pages": len(paths),
+        "unique_images": unique_images,
+        "seconds": elapsed,
+        "pages_per_second": len(paths) / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def manifest_path_for(output_path):
+    return output_path + ".manifest.json"
+
+
+def _load_manifest(output_path):
+    """Return the append manifest of ``output_path``, or None to start a new PDF.
+
+    A PDF longer than the manifest records is the leftover of an update that
+    was interrupted before the manifest was saved; it is truncated back so
+    those pages are simply appended again.
+    """
+    manifest_path = manifest_path_for(output_path)
+    if not os.path.exists(manifest_path):
+        if os.path.exists(output_path):
+            raise RuntimeError(f"{output_path} exists but has no {os.path.basename(manifest_path)}; "
+                               "move it away or choose another output file")
+        return None
+    if not os.path.exists(output_path):
+        return None
+
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    pdf_size = os.path.getsize(output_path)
+    if pdf_size < manifest["pdf_size"]:
+        raise RuntimeError(f"{output_path} is shorter than its manifest records; it was changed "
+                           "outside watch mode")
+    if pdf_size > manifest["pdf_size"]:
+        with open(output_path, "r+b") as output_file:
+            output_file.truncate(manifest["pdf_size"])
+    return manifest
+
+
+def _save_manifest(output_path, manifest):
+    manifest_path = manifest_path_for(output_path)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(temp_path, manifest_path)
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def append_pages(paths, output_path, workers=1, dedupe=True, page_size=None, target_dpi=None,
+                 passthrough=True, errors=None):
+    """Append images to ``output_path`` with a PDF incremental update.
+
+    The PDF is created on first use. Earlier pages are never rewritten: new
+    objects, a new page tree and a chained xref section are added to the
+    end of the file. A manifest next to the PDF records the writer state,
+    the files already embedded and the image digests available for
+    deduplication, so a restarted process continues where it stopped and
+    skips files it has embedded before. Returns the same dict as convert().
+
+    With ``errors`` a list, files that cannot be read are left out and
+    reported in it as ``(path, exception)``; the manifest records them as
+    failed, so they are only tried again once they change. Files that no
+    longer exist are left out.
+    """
+    paths = list(paths)
+    page_size = parse_page_size(page_size)
+    manifest = _load_manifest(output_path)
+    if manifest is None:
+        manifest = {"state": None, "files": {}, "images": {}}
+    failed = manifest.setdefault("failed", {})
+    # Signatures are taken once, so files that vanish later can still be recorded
+    signatures = {}
+    for path in paths:
+        try:
+            signatures[path] = _file_signature(path)
+        except OSError:
+            pass  # gone since it was listed
+    paths = [path for path, signature in signatures.items()
+             if signature not in (manifest["files"].get(os.path.abspath(path)),
+                                  failed.get(os.path.abspath(path)))]
+    new_errors = []
+
+    start_time = time.perf_counter()
+    if paths:
+        # A new PDF only takes its final name once its manifest is saved.
+        new_file = manifest["state"] is None
+        target_path = output_path + ".part" if new_file else output_path
+        with open(target_path, "wb" if new_file else "r+b") as output_file:
+            output_file.seek(0, os.SEEK_END)
+            writer = PdfStreamWriter(output_file, manifest["state"])
+            images = manifest["images"] if dedupe else None
+            prepared = prepare_pages(paths, workers, dedupe, known=manifest["images"],
+                                     errors=None if errors is None else new_errors,
+                                     passthrough=passthrough, page_size=page_size,
+                                     target_dpi=target_dpi)
+            unique_images = _write_pages(writer, prepared, images)
+            writer.close()
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            manifest["pdf_size"] = output_file.tell()
+        manifest["state"] = writer.state()
+        bad_paths = {path for path, _ in new_errors}
+        for path in paths:
+            if path in bad_paths:
+                failed[os.path.abspath(path)] = signatures[path]
+            else:
+                manifest["files"][os.path.abspath(path)] = signatures[path]
+                failed.pop(os.path.abspath(path), None)
+        if errors is not None:
+            errors.extend(new_errors)
+        _save_manifest(output_path, manifest)
+        if new_file:
+            os.replace(target_path, output_path)
+    else:
+        unique_images = 0
+    elapsed = time.perf_counter() - start_time
+
+    pages = len(paths) - len(new_errors)
+    return {
+        "pages": pages,
+        "unique_images": unique_images,
+        "seconds": elapsed,
+        "pages_per_second": pages / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def watch(directory, output_path, interval=5.0, **options):
+    """Poll ``directory`` and append new images to ``output_path`` until interrupted.
+
+    A file is only picked up once its size and modification time are the
+    same on two consecutive polls, so half-written scans are left alone.
+    A file that cannot be read is reported and skipped until it changes;
+    the other pages are still appended. ``options`` are passed on to
+    append_pages().
+    """
+    previous = {}
+    while True:
+        current = {}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                try:
+                    current[path] = _file_signature(path)
+                except OSError:
+                    pass  # renamed or deleted while listing; seen again next poll if it returns
+
+        stable = sorted((path for path, signature in current.items() if previous.get(path) == signature),
+                        key=natural_key)
+        if stable:
+            errors = []
+            stats = append_pages(stable, output_path, errors=errors, **options)
+            for path, error in errors:
+                print(f"Skipped {path}: {error}")
+            if stats["pages"]:
+                print(f"Appended {stats['pages']} pages to {output_path} in {stats['seconds']:.2f}s "
+                      f"({stats['pages_per_second']:.1f} pages/s)")
+        previous = current
+        time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert images into a single PDF, one page per image.")
+    parser.add_argument("inputs", nargs="*", default=["image.jpg"],
+                        help="image files, directories or glob patterns, in page order")
+    parser.add_argument("-o", "--output", default="output.pdf", help="output PDF path")
+    parser.add_argument("--no-passthrough", dest="passthrough", action="store_false",
+                        help="decode and re-compress JPEGs instead of embedding them as-is")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of processes preparing pages (0 = all cores)")
+    parser.add_argument("--no-dedupe", dest="dedupe", action="store_false",
+                        help="embed every page's image even when it repeats an earlier one")
+    parser.add_argument("--page-size", type=str.upper, choices=list(PAGE_SIZES),
+                        help="fit every image onto pages of this size (default: the image's own size)")
+    parser.add_argument("--dpi", type=float, dest="target_dpi",
+                        help="downsample images to at most this resolution on the page")
+    parser.add_argument("--watch", metavar="DIR",
+                        help="keep appending new images from DIR to the output PDF until interrupted")
+    parser.add_argument("--interval", type=float, default=5.0,
+                        help="seconds between directory polls in --watch mode")
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        try:
+            watch(args.watch, args.output, args.interval, passthrough=args.passthrough,
+                  workers=args.jobs, dedupe=args.dedupe, page_size=args.page_size,
+                  target_dpi=args.target_dpi)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    stats = convert(expand_inputs(args.inputs), args.output, passthrough=args.passthrough,
+                    workers=args.jobs, dedupe=args.dedupe, page_size=args.page_size,
+                    target_dpi=args.target_dpi)
+    print(f"Wrote {stats['pages']} pages ({stats['unique_images']} unique images) to {args.output} "
+          f"in {stats['seconds']:.2f}s ({stats['pages_per_second']:.1f} pages/s)")
+
+
+if __name__ == "__main__":
+    main()
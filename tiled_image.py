@@ -0,0 +1,93 @@
+# pip install numpy Pillow
+
+import math
+
+import numpy as np
+from PIL import Image
+
+# Raw pixel layouts that can be viewed directly as RGB arrays.
+RAW_RGB_MODES = ("RGB", "BGR")
+
+
+class MappedImage:
+    """Region access to an uncompressed RGB image through a memory map.
+
+    Works for images whose pixels are stored raw in the file (uncompressed
+    TIFF, BMP, PPM). Regions are read from and written to the file in place,
+    so only the pages a region touches are ever loaded, whatever the size of
+    the whole image. Raises ValueError for anything else.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        with Image.open(path) as image:
+            if image.mode != "RGB":
+                raise ValueError(f"{path} is {image.mode}, not RGB")
+            self.size = image.size
+            tiles = list(image.tile)
+        if not tiles:
+            raise ValueError(f"{path} has no pixel data")
+
+        self.data = np.memmap(path, np.uint8, "r+" if writable else "r")
+        self.tiles = []
+        for codec, extents, offset, args in tiles:
+            if not isinstance(args, tuple):
+                args = (args,)
+            rawmode, stride, ystep = (args + (0, 1))[:3]
+            if codec != "raw" or rawmode not in RAW_RGB_MODES or ystep not in (1, -1):
+                raise ValueError(f"{path} is compressed or uses an unsupported pixel layout")
+
+            left, top, right, bottom = extents
+            width, height = right - left, bottom - top
+            row_bytes = stride or width * 3
+            # View the tile's bytes as rows, drop any row padding, then split pixels
+            rows = self.data[offset:offset + height * row_bytes].reshape(height, row_bytes)
+            pixels = rows[:, :width * 3].reshape(height, width, 3)
+            if ystep == -1:
+                pixels = pixels[::-1]
+            if rawmode == "BGR":
+                pixels = pixels[..., ::-1]
+            self.tiles.append((extents, pixels))
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def _overlaps(self, box):
+        left, top, right, bottom = box
+        for (tile_left, tile_top, tile_right, tile_bottom), pixels in self.tiles:
+            x0, y0 = max(left, tile_left), max(top, tile_top)
+            x1, y1 = min(right, tile_right), min(bottom, tile_bottom)
+            if x0 < x1 and y0 < y1:
+                yield (slice(y0 - tile_top, y1 - tile_top), slice(x0 - tile_left, x1 - tile_left),
+                       slice(y0 - top, y1 - top), slice(x0 - left, x1 - left), pixels)
+
+    def read_region(self, box):
+        """Return a copy of the pixels in ``box`` as an RGB array."""
+        left, top, right, bottom = box
+        region = np.empty((bottom - top, right - left, 3), np.uint8)
+        for tile_rows, tile_cols, rows, cols, pixels in self._overlaps(box):
+            region[rows, cols] = pixels[tile_rows, tile_cols]
+        return region
+
+    def write_region(self, box, region):
+        """Write an RGB array back into ``box`` of the file."""
+        for tile_rows, tile_cols, rows, cols, pixels in self._overlaps(box):
+            pixels[tile_rows, tile_cols] = region[rows, cols]
+
+    def flush(self):
+        self.data.flush()
+
+    def proxy(self, max_size):
+        """Downscaled PIL copy that fits ``max_size``, sampled without reading every row."""
+        # Sample about twice the final resolution, then resample properly
+        step = max(1, math.floor(max(self.width / max_size[0], self.height / max_size[1]) / 2))
+        rows = [self.read_region((0, y, self.width, y + 1))[0, ::step]
+                for y in range(0, self.height, step)]
+        image = Image.fromarray(np.stack(rows))
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        return image
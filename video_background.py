@@ -0,0 +1,244 @@
+# pip install rembg Pillow opencv-python numpy  (and an ffmpeg binary on the PATH)
+
+import argparse
+import os
+import queue
+import subprocess
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+from rembg import remove
+
+from background_remover import DEFAULT_MODEL, FAST_MAX_SIDE, MODELS, create_session, guided_upsample
+from video_compress import find_ffmpeg
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+
+# Containers written with an alpha channel; anything else gets a solid background
+ALPHA_CODECS = {
+    ".webm": ["-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-b:v", "0", "-crf", "30", "-row-mt", "1",
+              "-c:a", "libopus"],
+    ".mov": ["-c:v", "prores_ks", "-profile:v", "4444", "-pix_fmt", "yuva444p10le", "-c:a", "pcm_s16le"],
+}
+OPAQUE_CODEC = ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", "18", "-preset", "medium", "-c:a", "aac"]
+
+GREEN_SCREEN = (0, 177, 64)
+
+# Frames are compared on grey copies this many pixels wide. A frame whose
+# mean absolute difference from the last inferred frame is below
+# REUSE_DIFFERENCE grey levels reuses that frame's mask, but never more
+# than MAX_REUSE_FRAMES frames in a row.
+DIFFERENCE_WIDTH = 64
+REUSE_DIFFERENCE = 2.0
+MAX_REUSE_FRAMES = 30
+
+# Frames each pipeline stage may hold before the one feeding it waits
+QUEUE_FRAMES = 8
+
+
+def _put(frames, item, stop):
+    # Blocks while the queue is full, but gives up once another stage failed
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(frames, stop):
+    while not stop.is_set():
+        try:
+            return frames.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def output_args(output_path):
+    """ffmpeg codec arguments for ``output_path`` and whether it keeps the alpha channel."""
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension in ALPHA_CODECS:
+        return ALPHA_CODECS[extension], True
+    return OPAQUE_CODEC, False
+
+
+def first_frame(path):
+    """First frame of a video as a PIL RGB image, for previews."""
+    capture = cv2.VideoCapture(path)
+    ok, frame = capture.read()
+    capture.release()
+    if not ok:
+        raise IOError(f"Cannot read video {path}")
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def remove_video_background(input_path, output_path, session, max_side=FAST_MAX_SIDE,
+                            reuse_difference=REUSE_DIFFERENCE, max_reuse=MAX_REUSE_FRAMES,
+                            background=GREEN_SCREEN, progress=None):
+    """Remove the background of every frame of a video.
+
+    ``.webm`` (VP9) and ``.mov`` (ProRes 4444) outputs keep an alpha
+    channel; other containers get H.264 with the cut-out composed over
+    ``background``. The audio is copied over.
+
+    Decoding, inference and encoding run on their own threads joined by
+    queues of QUEUE_FRAMES frames, so memory stays flat however long the
+    video is. Masks are inferred at ``max_side`` pixels and upsampled with
+    the guided filter. Frames that barely differ from the last inferred one
+    (see REUSE_DIFFERENCE) skip inference: the previous low-resolution mask
+    is upsampled again against the new frame, which keeps edges on small
+    movements. ``progress(done, total, inferred)`` is called after every
+    frame. Returns a dict of frame counts, seconds and frames/s.
+    """
+    capture = cv2.VideoCapture(input_path)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video {input_path}")
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    codec_args, alpha = output_args(output_path)
+    encoder = subprocess.Popen(
+        [find_ffmpeg(), "-hide_banner", "-nostdin", "-y", "-loglevel", "error",
+         "-f", "rawvideo", "-pix_fmt", "bgra" if alpha else "bgr24", "-s", f"{width}x{height}",
+         "-r", str(fps), "-i", "pipe:0", "-i", input_path, "-map", "0:v", "-map", "1:a?", "-shortest"]
+        + codec_args + [output_path],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    scale = min(1.0, max_side / max(width, height))
+    small_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    difference_size = (DIFFERENCE_WIDTH, max(1, round(height * DIFFERENCE_WIDTH / width)))
+    if not alpha:
+        # OpenCV frames are BGR, so the background colour is reversed
+        backdrop = np.empty((height, width, 3), np.uint8)
+        backdrop[:] = background[::-1]
+
+    decoded = queue.Queue(maxsize=QUEUE_FRAMES)
+    masked = queue.Queue(maxsize=QUEUE_FRAMES)
+    stop = threading.Event()
+    errors = []
+    counts = {"frames": 0, "inferred": 0}
+    start_time = time.perf_counter()
+
+    def failed(error):
+        errors.append(error)
+        stop.set()
+
+    def read():
+        try:
+            while not stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                if not _put(decoded, frame, stop):
+                    break
+        except Exception as e:
+            failed(e)
+        finally:
+            capture.release()
+            _put(decoded, None, stop)
+
+    def infer():
+        reference = None  # small grey copy of the last inferred frame
+        small_mask = None
+        reused = 0
+        try:
+            while True:
+                frame = _get(decoded, stop)
+                if frame is None:
+                    break
+                small = cv2.resize(frame, small_size, interpolation=cv2.INTER_AREA)
+                small_gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+                thumbnail = cv2.resize(small_gray, difference_size, interpolation=cv2.INTER_AREA)
+                if (reference is None or reused >= max_reuse
+                        or cv2.absdiff(thumbnail, reference).mean() >= reuse_difference):
+                    rgb = Image.fromarray(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+                    small_mask = np.asarray(remove(rgb, session=session, only_mask=True))
+                    reference = thumbnail
+                    reused = 0
+                    counts["inferred"] += 1
+                else:
+                    reused += 1
+                if small_size == (width, height):
+                    mask = small_mask
+                else:
+                    mask = guided_upsample(small_mask, small_gray, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                if not _put(masked, (frame, mask), stop):
+                    break
+        except Exception as e:
+            failed(e)
+        finally:
+            _put(masked, None, stop)
+
+    def write():
+        try:
+            while True:
+                item = _get(masked, stop)
+                if item is None:
+                    break
+                frame, mask = item
+                if alpha:
+                    output = np.dstack((frame, mask))
+                else:
+                    weight = mask.astype(np.float32) / 255
+                    output = cv2.blendLinear(frame, backdrop, weight, 1 - weight)
+                encoder.stdin.write(output.tobytes())
+                counts["frames"] += 1
+                if progress:
+                    progress(counts["frames"], total, counts["inferred"])
+        except Exception as e:
+            failed(e)
+
+    threads = [threading.Thread(target=stage, daemon=True) for stage in (read, infer, write)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        encoder.stdin.close()
+    except OSError:
+        pass
+    encoder_errors = encoder.stderr.read().decode("utf-8", "replace")
+    if encoder.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed: {encoder_errors.strip()}")
+    if errors:
+        raise errors[0]
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "frames": counts["frames"],
+        "inferred": counts["inferred"],
+        "reused": counts["frames"] - counts["inferred"],
+        "alpha": alpha,
+        "seconds": elapsed,
+        "frames_per_second": counts["frames"] / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove the background of a video.")
+    parser.add_argument("input", help="input video")
+    parser.add_argument("output", help="output video; .webm or .mov keep transparency, "
+                                       "other formats get a green screen")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, choices=MODELS, help="rembg model")
+    parser.add_argument("--reuse-difference", type=float, default=REUSE_DIFFERENCE,
+                        help=f"mean grey-level change below which a mask is reused (default: {REUSE_DIFFERENCE}, "
+                             "0 infers every frame)")
+    args = parser.parse_args(argv)
+
+    stats = remove_video_background(args.input, args.output, create_session(args.model),
+                                    reuse_difference=args.reuse_difference,
+                                    progress=lambda done, total, inferred: print(
+                                        f"\r{done}/{total} frames, {inferred} inferred", end="", flush=True))
+    print(f"\n{stats['frames']} frames in {stats['seconds']:.1f}s ({stats['frames_per_second']:.1f} frames/s), "
+          f"{stats['reused']} reused a mask")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# Requires an ffmpeg binary with libx264 on the PATH (https://ffmpeg.org)
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+VIDEO_CODEC = "libx264"
+AUDIO_BITRATE = 128_000
+
+# Constant-quality setting the sample pass estimates the natural size at
+REFERENCE_CRF = 23
+
+# Short clips spread over the input, encoded quickly to estimate the size
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 4.0
+
+# Share of the target size taken by the container and index
+CONTAINER_OVERHEAD = 0.01
+
+# A second pass 2 is run if the result misses the target by more than this
+SIZE_TOLERANCE = 0.03
+
+# Segment-parallel encodes never cut the input into pieces shorter than this
+MIN_SEGMENT_SECONDS = 20.0
+
+
+def find_ffmpeg():
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg was not found on the PATH")
+    return ffmpeg
+
+
+def probe(path):
+    """Duration in seconds and audio bitrate (bits/s, 0 without audio) of a video, read from ffmpeg."""
+    result = subprocess.run([find_ffmpeg(), "-hide_banner", "-i", path],
+                            capture_output=True, text=True, errors="replace")
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+\.?\d*)", result.stderr)
+    if not duration:
+        raise ValueError(f"Could not read the duration of {path}")
+    hours, minutes, seconds = duration.groups()
+    audio = re.search(r"Stream #.*: Audio: (.*)", result.stderr)
+    if not audio:
+        audio_bitrate = 0
+    else:
+        # Re-encoding never needs more than the source bitrate
+        source_bitrate = re.search(r"(\d+) kb/s", audio.group(1))
+        audio_bitrate = min(AUDIO_BITRATE, int(source_bitrate.group(1)) * 1000) if source_bitrate else AUDIO_BITRATE
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds), audio_bitrate
+
+
+def video_stream_bytes(path):
+    """Size in bytes of the video stream of a file, without its audio and container."""
+    result = subprocess.run([find_ffmpeg(), "-hide_banner", "-nostdin", "-i", path, "-map", "0:v:0",
+                             "-c", "copy", "-f", "null", "-"], capture_output=True, text=True, errors="replace")
+    video = re.search(r"video:(\d+)(?:KiB|kB)", result.stderr)
+    if result.returncode != 0 or not video:
+        raise RuntimeError(f"Could not measure the video stream of {path}")
+    return int(video.group(1)) * 1024
+
+
+def run_ffmpeg(args, duration=None, progress=None):
+    """Run ffmpeg, reporting the fraction of ``duration`` done to ``progress``."""
+    command = [find_ffmpeg(), "-hide_banner", "-nostdin", "-y", "-loglevel", "error",
+               "-progress", "pipe:1", "-nostats"] + args
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, errors="replace")
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        if progress and duration and key == "out_time_us" and value.isdigit():
+            progress(min(1.0, int(value) / 1e6 / duration))
+    errors = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed: {errors.strip()}")
+
+
+def estimate_size(path, crf=REFERENCE_CRF, duration=None, audio_bitrate=None):
+    """Estimate the output size in bytes at constant quality ``crf`` from a fast sample pass.
+
+    A few short clips spread over the input are encoded with the veryfast
+    preset, whose size is close to the slower presets at the same CRF, and
+    their bitrate is extrapolated to the whole duration. This is
+    the size the video needs to look as good as ``crf``; targets well below
+    it will show compression artefacts.
+    """
+    if duration is None:
+        duration, audio_bitrate = probe(path)
+    sample_seconds = min(SAMPLE_SECONDS, duration / SAMPLE_COUNT)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sample_path = os.path.join(temp_dir, "sample.mkv")
+        sample_bytes = 0
+        for index in range(SAMPLE_COUNT):
+            start = (duration - sample_seconds) * (index + 0.5) / SAMPLE_COUNT
+            run_ffmpeg(["-ss", f"{start:.3f}", "-t", f"{sample_seconds:.3f}", "-i", path, "-an",
+                        "-c:v", VIDEO_CODEC, "-preset", "veryfast", "-crf", str(crf), sample_path])
+            sample_bytes += os.path.getsize(sample_path)
+    video_bitrate = sample_bytes * 8 / (SAMPLE_COUNT * sample_seconds)
+    return int((video_bitrate + audio_bitrate) * duration / 8 * (1 + CONTAINER_OVERHEAD))
+
+
+def video_bitrate_for_size(target_bytes, duration, audio_bitrate):
+    """Video bitrate in bits/s that makes a file of ``duration`` seconds ``target_bytes`` long."""
+    total_bitrate = target_bytes * 8 * (1 - CONTAINER_OVERHEAD) / duration
+    video_bitrate = total_bitrate - audio_bitrate
+    if video_bitrate < 10_000:
+        raise ValueError("The target size is too small for this video's length and audio")
+    return int(video_bitrate)
+
+
+def encode_two_pass(input_path, output_path, video_bitrate, audio_bitrate, duration, preset="medium",
+                    progress=None, log_dir=None, threads=0):
+    """Two-pass x264 encode at an average ``video_bitrate`` (bits/s).
+
+    Pass 1 only writes the rate-control statistics; pass 2 uses them to
+    spread the bits over the video. ``progress`` receives the overall
+    fraction done. The statistics stay in ``log_dir`` so pass 2 can be re-run.
+    ``threads`` limits x264's threads (0 lets it use every core).
+    """
+    video_args = _video_args(video_bitrate, preset, log_dir, threads)
+    first = (lambda fraction: progress(fraction / 2)) if progress else None
+    second = (lambda fraction: progress(0.5 + fraction / 2)) if progress else None
+    run_ffmpeg(["-i", input_path] + video_args + ["-pass", "1", "-an", "-f", "null", os.devnull],
+               duration, first)
+    encode_second_pass(input_path, output_path, video_args, audio_bitrate, duration, second)
+
+
+def _video_args(video_bitrate, preset, log_dir, threads=0):
+    return ["-c:v", VIDEO_CODEC, "-preset", preset, "-b:v", str(video_bitrate), "-pix_fmt", "yuv420p",
+            "-threads", str(threads), "-passlogfile", os.path.join(log_dir, "x264")]
+
+
+def encode_second_pass(input_path, output_path, video_args, audio_bitrate, duration, progress=None):
+    audio_args = ["-c:a", "aac", "-b:a", str(audio_bitrate)] if audio_bitrate else ["-an"]
+    run_ffmpeg(["-i", input_path] + video_args + ["-pass", "2"] + audio_args
+               + ["-movflags", "+faststart", output_path], duration, progress)
+
+
+def compress_video(input_path, output_path, target_bytes=None, video_bitrate=None, preset="medium",
+                   estimate=True, progress=None):
+    """Compress a video to ``target_bytes`` (or an explicit ``video_bitrate``) with a two-pass encode.
+
+    If the result misses the target size by more than SIZE_TOLERANCE, pass 2
+    is re-run once at a corrected bitrate, reusing the pass 1 statistics.
+    Returns a dict with the size, target, sample-pass estimate (None if
+    ``estimate`` is False), bitrate and elapsed seconds.
+    """
+    if (target_bytes is None) == (video_bitrate is None):
+        raise ValueError("Give either a target size or a video bitrate")
+    start_time = time.perf_counter()
+    duration, audio_bitrate = probe(input_path)
+    estimated = estimate_size(input_path, duration=duration, audio_bitrate=audio_bitrate) if estimate else None
+    if target_bytes is not None:
+        video_bitrate = video_bitrate_for_size(target_bytes, duration, audio_bitrate)
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        encode_two_pass(input_path, output_path, video_bitrate, audio_bitrate, duration, preset,
+                        progress, log_dir)
+        size = os.path.getsize(output_path)
+        if target_bytes and abs(size - target_bytes) > SIZE_TOLERANCE * target_bytes:
+            # Scale only the video; the audio and the container stay as they are
+            video_bytes = video_stream_bytes(output_path)
+            video_bitrate = int(video_bitrate * (target_bytes - (size - video_bytes)) / video_bytes)
+            if video_bitrate > 0:
+                encode_second_pass(input_path, output_path, _video_args(video_bitrate, preset, log_dir),
+                                   audio_bitrate, duration)
+                size = os.path.getsize(output_path)
+
+    return {
+        "size": size,
+        "target": target_bytes,
+        "estimate": estimated,
+        "video_bitrate": video_bitrate,
+        "seconds": time.perf_counter() - start_time,
+    }
+
+
+def split_at_keyframes(input_path, segment_dir, count, duration):
+    """Cut the video stream into about ``count`` equal pieces without re-encoding.
+
+    With stream copy the segment muxer can only cut on keyframes, so each
+    piece starts at the first keyframe after its nominal start and decodes
+    on its own. Returns the segment paths in order.
+    """
+    times = ",".join(f"{duration * index / count:.3f}" for index in range(1, count))
+    pattern = os.path.join(segment_dir, "source%04d.mkv")
+    segment_args = ["-segment_times", times] if times else []
+    run_ffmpeg(["-i", input_path, "-map", "0:v:0", "-c", "copy", "-f", "segment"] + segment_args
+               + ["-reset_timestamps", "1", pattern])
+    return sorted(os.path.join(segment_dir, name) for name in os.listdir(segment_dir)
+                  if name.startswith("source"))
+
+
+def concat_segments(segment_paths, audio_path, output_path, list_dir):
+    """Join encoded segments (and the separately encoded audio) by stream copy."""
+    list_path = os.path.join(list_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as list_file:
+        for path in segment_paths:
+            escaped = path.replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    audio_args = ["-i", audio_path, "-map", "0:v", "-map", "1:a"] if audio_path else []
+    run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path] + audio_args
+               + ["-c", "copy", "-movflags", "+faststart", output_path])
+
+
+def compress_segmented(input_path, output_path, target_bytes=None, video_bitrate=None, preset="medium",
+                       workers=None, estimate=True, progress=None):
+    """compress_video() for long inputs, split at keyframes and encoded on every core.
+
+    The video is cut into one piece per worker, each piece gets its own
+    two-pass ffmpeg process at the common bitrate, the audio is encoded once
+    alongside, and everything is joined again by stream copy. As in
+    compress_video(), if the joined file misses the target size by more than
+    SIZE_TOLERANCE, pass 2 of every segment is re-run once at a corrected
+    bitrate. ``progress`` receives a list with the fraction done of every
+    segment. Returns the same dict as compress_video(), plus the number of
+    segments.
+    """
+    if (target_bytes is None) == (video_bitrate is None):
+        raise ValueError("Give either a target size or a video bitrate")
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    duration, audio_bitrate = probe(input_path)
+    count = max(1, min(workers, int(duration // MIN_SEGMENT_SECONDS)))
+    if count == 1:
+        # Not worth splitting; the single encode can also correct its size
+        stats = compress_video(input_path, output_path, target_bytes, video_bitrate, preset, estimate,
+                               (lambda fraction: progress([fraction])) if progress else None)
+        stats["segments"] = 1
+        return stats
+    estimated = estimate_size(input_path, duration=duration, audio_bitrate=audio_bitrate) if estimate else None
+    if target_bytes is not None:
+        video_bitrate = video_bitrate_for_size(target_bytes, duration, audio_bitrate)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = split_at_keyframes(input_path, work_dir, count, duration)
+        encoded = [os.path.join(work_dir, f"encoded{index:04d}.mp4") for index in range(len(sources))]
+        fractions = [0.0] * len(sources)
+        lock = threading.Lock()
+
+        def report(index, fraction):
+            with lock:
+                fractions[index] = fraction
+                snapshot = list(fractions)
+            if progress:
+                progress(snapshot)
+
+        durations = [probe(source)[0] for source in sources]
+        threads = max(1, (os.cpu_count() or 1) // len(sources))
+
+        def encode(index):
+            log_dir = os.path.join(work_dir, f"pass{index:04d}")
+            os.mkdir(log_dir)
+            encode_two_pass(sources[index], encoded[index], video_bitrate, 0, durations[index],
+                            preset, lambda fraction: report(index, fraction), log_dir, threads)
+
+        def encode_again(index):
+            # Pass 2 only, reusing the pass 1 statistics of the segment
+            log_dir = os.path.join(work_dir, f"pass{index:04d}")
+            encode_second_pass(sources[index], encoded[index],
+                               _video_args(video_bitrate, preset, log_dir, threads), 0, durations[index],
+                               lambda fraction: report(index, fraction))
+
+        audio_path = os.path.join(work_dir, "audio.m4a") if audio_bitrate else None
+        with ThreadPoolExecutor(max_workers=min(workers, len(sources)) + bool(audio_path)) as pool:
+            jobs = [pool.submit(encode, index) for index in range(len(sources))]
+            if audio_path:
+                jobs.append(pool.submit(run_ffmpeg, ["-i", input_path, "-vn", "-c:a", "aac",
+                                                     "-b:a", str(audio_bitrate), audio_path]))
+            for job in jobs:
+                job.result()
+            concat_segments(encoded, audio_path, output_path, work_dir)
+
+            size = os.path.getsize(output_path)
+            if target_bytes and abs(size - target_bytes) > SIZE_TOLERANCE * target_bytes:
+                # Scale only the video; the audio and the container stay as they are
+                video_bytes = sum(os.path.getsize(path) for path in encoded)
+                video_bitrate = int(video_bitrate * (target_bytes - (size - video_bytes)) / video_bytes)
+                if video_bitrate > 0:
+                    for job in [pool.submit(encode_again, index) for index in range(len(sources))]:
+                        job.result()
+                    concat_segments(encoded, audio_path, output_path, work_dir)
+                    size = os.path.getsize(output_path)
+
+    return {
+        "size": size,
+        "target": target_bytes,
+        "estimate": estimated,
+        "video_bitrate": video_bitrate,
+        "segments": len(sources),
+        "seconds": time.perf_counter() - start_time,
+    }
+
+
+def parse_size(text):
+    """Byte count from text such as '25MB', '700k' or '1.5G' (units are powers of 1000)."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmg]?)b?\s*", text.lower())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    number, unit = match.groups()
+    return int(float(number) * {"": 1, "k": 1e3, "m": 1e6, "g": 1e9}[unit])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress a video to a target size with a two-pass encode.")
+    parser.add_argument("input", help="video to compress")
+    parser.add_argument("-o", "--output", help="output MP4 (default: <input>_compressed.mp4)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-s", "--size", type=parse_size, help="target file size, e.g. 25MB")
+    target.add_argument("-b", "--bitrate", type=parse_size, help="video bitrate in bits/s, e.g. 2M")
+    parser.add_argument("--preset", default="medium", help="x264 preset (default: medium)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="encode this many keyframe-aligned segments in parallel (0: one per core)")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.input)[0] + "_compressed.mp4"
+    if args.jobs == 1:
+        stats = compress_video(args.input, output, args.size, args.bitrate, args.preset,
+                               progress=lambda fraction: print(f"\r{fraction:.0%}", end="", flush=True))
+    else:
+        stats = compress_segmented(args.input, output, args.size, args.bitrate, args.preset, args.jobs or None,
+                                   progress=lambda fractions: print(
+                                       "\r" + " ".join(f"{fraction:4.0%}" for fraction in fractions),
+                                       end="", flush=True))
+    print(f"\nEstimated {stats['estimate'] / 1e6:.1f} MB at CRF {REFERENCE_CRF}; "
+          f"wrote {output} ({stats['size'] / 1e6:.2f} MB) in {stats['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+# pip install opencv-python
+
+import argparse
+import collections
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Frames the ring buffer holds between the capture and encoder threads
+RING_SECONDS = 2.0
+
+# The real capture rate is measured over this long before the writer is opened
+FPS_WARMUP_SECONDS = 1.0
+
+# Used when the camera does not report a frame rate
+DEFAULT_FPS = 20.0
+
+# Motion-triggered recordings keep this much video from before the motion
+# starts and after it stops
+PRE_ROLL_SECONDS = 3.0
+POST_ROLL_SECONDS = 3.0
+
+# Preview tap: frames handed to a watcher per second, and their width
+PREVIEW_FPS = 2.0
+PREVIEW_WIDTH = 320
+
+
+class MotionDetector:
+    """Cheap motion test on small, blurred grayscale copies of the frames.
+
+    Each frame is compared with a running average of the previous ones, so
+    slow lighting changes fade into the background. Motion is reported when
+    more than ``threshold`` of the pixels differ by over ``sensitivity``.
+    """
+
+    def __init__(self, threshold=0.005, sensitivity=25, width=160):
+        self.threshold = threshold
+        self.sensitivity = sensitivity
+        self.width = width
+        self.background = None
+
+    def update(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, height * self.width // width)),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.background is None:
+            self.background = gray.astype(np.float32)
+            return False
+        difference = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(gray, self.background, 0.05)
+        return np.count_nonzero(difference > self.sensitivity) > self.threshold * difference.size
+
+
+class FrameRing:
+    """Bounded buffer of (timestamp, frame) pairs between two threads.
+
+    When it is full the oldest frame is discarded, so the producer never
+    waits on a slow consumer. Discarded frames are counted in ``dropped``.
+    """
+
+    def __init__(self, capacity):
+        self.items = collections.deque(maxlen=max(2, capacity))
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self):
+        """Oldest item, waiting for one; None once the ring is closed and empty."""
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class Recording:
+    """Record a camera to a video file with separate capture and encoder threads.
+
+    The capture thread only reads and timestamps frames into a FrameRing, so
+    an encoder stall can never hold up the camera. The encoder measures the
+    real capture rate over the first second, opens the writer at that rate
+    and places every frame by its timestamp: gaps are filled by repeating the
+    previous frame and frames that arrive ahead of the timeline are dropped,
+    so the file plays back at wall-clock speed however the load varies.
+
+    With ``segment_seconds`` or ``segment_bytes`` the recording rotates to a
+    new file ``<name>_00001.avi``, ``<name>_00002.avi``... whenever the open
+    one reaches that length or size. Frames keep arriving in the ring buffer
+    while a file is closed and the next one opened, so none are lost at the
+    switch. ``<name>_index.json`` lists the segments and is rewritten at every
+    switch. Beyond ``keep_segments`` files, or ``keep_bytes`` of finished
+    segments, the oldest are deleted, so 24/7 captures stay within a fixed
+    disk budget.
+
+    With ``motion`` the encoder only writes while a MotionDetector sees
+    movement. Idle frames wait in a pre-roll buffer of PRE_ROLL_SECONDS that
+    is written out first when motion starts, and every event becomes its own
+    segment file in the index, ending POST_ROLL_SECONDS after the motion.
+    Idle frames are never encoded, so storage and CPU fall with idle time.
+
+    Nothing is displayed. While ``on_preview`` is set (it can be set and
+    cleared at any time) it is called from the encoder thread with a
+    PREVIEW_WIDTH copy of the frame PREVIEW_FPS times a second; when nobody
+    watches, the tap costs nothing.
+    """
+
+    def __init__(self, output_path, camera=0, duration=None, fourcc="XVID", on_preview=None,
+                 segment_seconds=None, segment_bytes=None, keep_segments=None, keep_bytes=None,
+                 motion=False):
+        self.output_path = output_path
+        self.camera = camera
+        self.duration = duration  # seconds, or None to record until stop()
+        self.fourcc = fourcc
+        self.on_preview = on_preview
+        self.last_preview = 0.0
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.keep_segments = keep_segments
+        self.keep_bytes = keep_bytes
+        self.motion = motion
+        self.detector = MotionDetector() if motion else None
+        self.pre_roll = None
+        self.last_motion = None
+        self.idle_frames = 0
+        self.segments = []  # index entries, oldest first
+        self.segment_frames = 0
+        self.frame_size = None
+        self.cap = None
+        self.writer = None
+        self.ring = None
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.error = None
+        self.fps = None
+        self.captured = 0
+        self.written = 0
+        self.late = 0
+        self.duplicated = 0
+        self.first_timestamp = None
+        self.last_frame = None
+
+    def start(self):
+        self.cap = cv2.VideoCapture(self.camera)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise IOError("Cannot open webcam")
+        nominal_fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        self.ring = FrameRing(int(nominal_fps * RING_SECONDS))
+        self.threads = [threading.Thread(target=self._capture, daemon=True),
+                        threading.Thread(target=self._encode, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """Stop capturing, let the encoder drain the buffer and close the file."""
+        self.stop_event.set()
+        self.wait()
+
+    def wait(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    @property
+    def rotating(self):
+        return bool(self.segment_seconds or self.segment_bytes or self.motion)
+
+    @property
+    def index_path(self):
+        return os.path.splitext(self.output_path)[0] + "_index.json"
+
+    def stats(self):
+        return {
+            "captured": self.captured,
+            "written": self.written,
+            "dropped": (self.ring.dropped if self.ring else 0) + self.late,
+            "duplicated": self.duplicated,
+            "fps": self.fps or 0.0,
+            "segments": len(self.segments),
+            "idle": self.idle_frames,
+        }
+
+    def _capture(self):
+        start_time = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                if self.duration and time.monotonic() - start_time >= self.duration:
+                    break
+                ret, frame = self.cap.read()
+                if not ret:
+                    self.error = "Could not read frame from camera."
+                    break
+                self.captured += 1
+                self.ring.put((time.monotonic(), frame))
+        finally:
+            self.cap.release()
+            self.ring.close()
+
+    def _encode(self):
+        warmup = []
+        try:
+            while True:
+                item = self.ring.get()
+                if item is None:
+                    break
+                if self.fps is None:
+                    # Hold frames until the capture rate is known
+                    warmup.append(item)
+                    if item[0] - warmup[0][0] < FPS_WARMUP_SECONDS:
+                        continue
+                    self._measure_rate(warmup)
+                    items, warmup = warmup, []
+                else:
+                    items = [item]
+                for timestamp, frame in items:
+                    self._handle(timestamp, frame)
+                if self.on_preview:
+                    self._tap(*items[-1])
+            if warmup:  # shorter than the warm-up
+                self._measure_rate(warmup)
+                for timestamp, frame in warmup:
+                    self._handle(timestamp, frame)
+        except Exception as e:
+            self.error = str(e)
+            self.stop_event.set()
+        finally:
+            if self.writer:
+                self._finish_segment()
+
+    def _measure_rate(self, frames):
+        span = frames[-1][0] - frames[0][0]
+        if len(frames) > 1 and span > 0:
+            self.fps = (len(frames) - 1) / span
+        else:
+            self.fps = DEFAULT_FPS
+        height, width = frames[0][1].shape[:2]
+        self.frame_size = (width, height)
+        self.first_timestamp = frames[0][0]
+        if self.motion:
+            self.pre_roll = collections.deque(maxlen=max(1, int(PRE_ROLL_SECONDS * self.fps)))
+        else:
+            self._start_segment()
+
+    def _handle(self, timestamp, frame):
+        if not self.motion:
+            self._write_timed(timestamp, frame)
+            return
+        if self.detector.update(frame):
+            self.last_motion = timestamp
+        if self.last_motion is not None and timestamp - self.last_motion <= POST_ROLL_SECONDS:
+            if self.writer is None:
+                self._start_event(timestamp, frame)
+            self._write_timed(timestamp, frame)
+        else:
+            if self.writer is not None:
+                self._finish_segment()
+                if self._apply_retention():
+                    self._save_index()
+            if len(self.pre_roll) == self.pre_roll.maxlen:
+                self.idle_frames += 1  # falls out of the pre-roll without being encoded
+            self.pre_roll.append((timestamp, frame))
+
+    def _start_event(self, timestamp, frame):
+        # Shift the timeline so the event continues the file's frame count
+        # instead of being padded out to the idle time before it
+        first_timestamp = self.pre_roll[0][0] if self.pre_roll else timestamp
+        self.first_timestamp = first_timestamp - self.written / self.fps
+        self.last_frame = None
+        self._start_segment()
+        for buffered_timestamp, buffered_frame in self.pre_roll:
+            self._write_timed(buffered_timestamp, buffered_frame)
+        self.pre_roll.clear()
+
+    def _start_segment(self):
+        number = self.segments[-1]["number"] + 1 if self.segments else 1
+        if self.rotating:
+            root, extension = os.path.splitext(self.output_path)
+            path = f"{root}_{number:05d}{extension}"
+        else:
+            path = self.output_path
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.frame_size)
+        if not self.writer.isOpened():
+            self.writer = None
+            raise IOError("Cannot open video writer")
+        self.segment_frames = 0
+        self.segments.append({
+            "number": number,
+            "file": os.path.basename(path),
+            "path": path,
+            "start": self.written / self.fps,  # seconds into the recording
+            "started_at": time.time(),
+            "frames": 0,
+            "bytes": 0,
+        })
+        self._save_index()
+
+    def _finish_segment(self):
+        self.writer.release()
+        self.writer = None
+        segment = self.segments[-1]
+        segment["frames"] = self.segment_frames
+        segment["bytes"] = os.path.getsize(segment["path"])
+        self._save_index()
+
+    def _segment_full(self):
+        if self.segment_seconds and self.segment_frames >= self.segment_seconds * self.fps:
+            return True
+        if self.segment_bytes and self.segment_frames:
+            # A stat per frame is negligible next to encoding it
+            return os.path.getsize(self.segments[-1]["path"]) >= self.segment_bytes
+        return False
+
+    def _rotate(self):
+        self._finish_segment()
+        self._start_segment()
+        if self._apply_retention():
+            self._save_index()
+
+    def _apply_retention(self):
+        """Delete the oldest finished segments beyond the limits; True if any were."""
+        finished = self.segments[:-1]  # the open segment is never deleted
+        removed = False
+        while finished:
+            total_bytes = sum(segment["bytes"] for segment in finished)
+            over_count = self.keep_segments and len(finished) >= self.keep_segments
+            over_bytes = self.keep_bytes and total_bytes > self.keep_bytes
+            if not (over_count or over_bytes):
+                break
+            oldest = finished.pop(0)
+            try:
+                os.remove(oldest["path"])
+            except FileNotFoundError:
+                pass
+            self.segments.remove(oldest)
+            removed = True
+        return removed
+
+    def _save_index(self):
+        if not self.rotating:
+            return
+        index = {
+            "fps": self.fps,
+            "frame_size": list(self.frame_size),
+            "segments": [{key: value for key, value in segment.items() if key != "path"}
+                         for segment in self.segments],
+        }
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump(index, index_file, indent=2)
+        os.replace(temp_path, self.index_path)
+
+    def _write_timed(self, timestamp, frame):
+        index = round((timestamp - self.first_timestamp) * self.fps)
+        if index < self.written:
+            self.late += 1
+            return
+        while self.written < index and self.last_frame is not None:
+            self._write_frame(self.last_frame)
+            self.duplicated += 1
+        self._write_frame(frame)
+        self.last_frame = frame
+
+    def _write_frame(self, frame):
+        if self.rotating and self._segment_full():
+            self._rotate()
+        self.writer.write(frame)
+        self.written += 1
+        self.segment_frames += 1
+
+    def _tap(self, timestamp, frame):
+        on_preview = self.on_preview  # may be cleared from another thread
+        if on_preview and timestamp - self.last_preview >= 1 / PREVIEW_FPS:
+            self.last_preview = timestamp
+            height, width = frame.shape[:2]
+            size = (PREVIEW_WIDTH, max(1, height * PREVIEW_WIDTH // width))
+            on_preview(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+
+
+def record(output_path, duration=None, camera=0, **options):
+    """Record a camera to ``output_path`` without any UI and return the stats.
+
+    Blocks until ``duration`` seconds have passed (forever if None) or the
+    process is interrupted with Ctrl+C, then closes the file cleanly. Other
+    keyword arguments are passed to Recording. Raises IOError if the camera
+    fails.
+    """
+    recording = Recording(output_path, camera, duration, **options)
+    recording.start()
+    try:
+        while recording.running:
+            recording.wait(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recording.stop()
+    if recording.error:
+        raise IOError(recording.error)
+    return recording.stats()
+
+
+def _show_preview(frame):
+    cv2.imshow("Preview", frame)
+    cv2.waitKey(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record a webcam to video files with no UI.")
+    parser.add_argument("output", nargs="?",
+                        help="output video (default: output_<timestamp>.avi in the current folder)")
+    parser.add_argument("-t", "--minutes", type=float, help="recording length (default: until Ctrl+C)")
+    parser.add_argument("--camera", default="0", help="camera index or stream URL (default: 0)")
+    parser.add_argument("--fourcc", default="XVID", help="video codec (default: XVID)")
+    parser.add_argument("--segment-minutes", type=float, help="start a new file every N minutes")
+    parser.add_argument("--segment-mb", type=float, help="start a new file every N MB")
+    parser.add_argument("--keep", type=int, help="keep only the newest N segment files")
+    parser.add_argument("--keep-mb", type=float, help="keep at most N MB of finished segments")
+    parser.add_argument("--motion", action="store_true", help="only record while there is motion")
+    parser.add_argument("--preview", action="store_true",
+                        help=f"show a {PREVIEW_FPS:g} fps downscaled preview window (needs a display)")
+    args = parser.parse_args(argv)
+
+    output = args.output or f"output_{int(time.time())}.avi"
+    camera = int(args.camera) if args.camera.isdigit() else args.camera
+    print(f"Recording to {output}, press Ctrl+C to stop")
+    stats = record(output, args.minutes * 60 if args.minutes else None, camera,
+                   fourcc=args.fourcc,
+                   on_preview=_show_preview if args.preview else None,
+                   segment_seconds=args.segment_minutes * 60 if args.segment_minutes else None,
+                   segment_bytes=int(args.segment_mb * 1e6) if args.segment_mb else None,
+                   keep_segments=args.keep,
+                   keep_bytes=int(args.keep_mb * 1e6) if args.keep_mb else None,
+                   motion=args.motion)
+    print(f"{stats['written']} frames at {stats['fps']:.1f} fps in {stats['segments']} file(s), "
+          f"{stats['dropped']} dropped, {stats['duplicated']} duplicated, {stats['idle']} idle skipped")
+
+
+if __name__ == "__main__":
+    main()